@@ -0,0 +1,234 @@
+"""Stubbed Discord layer for running the bot without network access.
+
+FakeDiscord answers the REST requests of discord.py with plausible
+payloads, the gateway is replaced by populating the connection state with
+generated guilds directly and feeding messages to the command processing.
+"""
+import asyncio
+from bot import Bot
+from datetime import datetime
+import discord
+import itertools
+
+BOT_ID = 1000
+# Ids of generated objects, all below the ids of snowflakes of real objects.
+_ids = itertools.count(10**6)
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+def user_payload(user_id: int, name: str, *, bot: bool = False) -> dict:
+    return {
+        'id': str(user_id),
+        'username': name,
+        'discriminator': '0001',
+        'avatar': None,
+        'bot': bot
+    }
+
+
+def member_payload(user: dict) -> dict:
+    return {
+        'user': user,
+        'roles': [],
+        'joined_at': datetime.utcnow().isoformat(),
+        'deaf': False,
+        'mute': False
+    }
+
+
+class FakeGuild:
+    """Ids of a generated guild with one user in a voice channel."""
+
+    def __init__(self, index: int):
+        self.id = next_id()
+        self.text_channel_id = next_id()
+        self.voice_channel_id = next_id()
+        self.user_id = next_id()
+        self.name = f'Guild {index}'
+
+    def payload(self) -> dict:
+        bot_user = user_payload(BOT_ID, 'lavabot', bot=True)
+        user = user_payload(self.user_id, f'user-{self.id}')
+
+        return {
+            'id': str(self.id),
+            'name': self.name,
+            'region': 'eu-central',
+            'owner_id': str(self.user_id),
+            'member_count': 2,
+            'features': [],
+            'emojis': [],
+            'roles': [{
+                'id': str(self.id),
+                'name': '@everyone',
+                # Administrator, so menus may manage reactions.
+                'permissions': '8',
+                'permissions_new': '8',
+                'position': 0,
+                'color': 0,
+                'hoist': False,
+                'managed': False,
+                'mentionable': False
+            }],
+            'channels': [{
+                'id': str(self.text_channel_id),
+                'type': 0,
+                'name': 'music',
+                'position': 0,
+                'permission_overwrites': []
+            }, {
+                'id': str(self.voice_channel_id),
+                'type': 2,
+                'name': 'Voice',
+                'position': 1,
+                'bitrate': 64000,
+                'user_limit': 0,
+                'permission_overwrites': []
+            }],
+            'members': [member_payload(bot_user),
+                        member_payload(user)],
+            'voice_states': [{
+                'user_id': str(self.user_id),
+                'channel_id': str(self.voice_channel_id),
+                'session_id': 'session',
+                'deaf': False,
+                'mute': False,
+                'self_deaf': False,
+                'self_mute': False,
+                'suppress': False
+            }]
+        }
+
+
+class FakeGateway:
+    """Replacement of the gateway websocket, only voice state updates are sent."""
+
+    async def voice_state(self, guild_id, channel_id, self_mute=False,
+                          self_deaf=False):
+        pass
+
+
+class FakeDiscord:
+    """Answer the REST requests of discord.py without sending them.
+
+    Every request waits for the configured latency. Sent messages are
+    handed to the waiters registered with wait_for_message.
+    """
+
+    def __init__(self, bot: discord.Client, *, latency: float = 0.01):
+        self.bot = bot
+        self.latency = latency
+
+        self.requests = 0
+        self._waiters = []
+
+    def wait_for_message(self, check) -> asyncio.Future:
+        """Return a future resolved with the first sent message payload passing a check."""
+        future = self.bot.loop.create_future()
+        self._waiters.append((check, future))
+        return future
+
+    def _message(self, route, payload: dict, message_id: int) -> dict:
+        data = {
+            'id': str(message_id),
+            'channel_id': str(route.channel_id),
+            'author': user_payload(BOT_ID, 'lavabot', bot=True),
+            'content': payload.get('content') or '',
+            'embeds': [payload['embed']] if payload.get('embed') else [],
+            'attachments': [],
+            'mentions': [],
+            'mention_roles': [],
+            'mention_everyone': False,
+            'pinned': False,
+            'tts': False,
+            'type': 0,
+            'timestamp': datetime.utcnow().isoformat(),
+            'edited_timestamp': None
+        }
+
+        for check, future in list(self._waiters):
+            if not future.done() and check(data):
+                future.set_result(data)
+                self._waiters.remove((check, future))
+        return data
+
+    async def request(self, route, *, files=None, form=None, **kwargs):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+        method, path = route.method, route.path
+        if path == '/channels/{channel_id}/messages' and method == 'POST':
+            return self._message(route, kwargs.get('json') or {}, next_id())
+        if (path == '/channels/{channel_id}/messages/{message_id}' and
+                method == 'PATCH'):
+            message_id = int(route.url.rsplit('/', 1)[-1])
+            return self._message(route, kwargs.get('json') or {}, message_id)
+        return None
+
+
+class BenchBot(Bot):
+    """Bot whose REST requests are answered by FakeDiscord."""
+
+    def __init__(self, *args, discord_latency: float = 0.01, **kwargs):
+        self.discord_latency = discord_latency
+        super().__init__(*args, **kwargs)
+
+    def _instrument_http(self):
+        self.fake_discord = FakeDiscord(self, latency=self.discord_latency)
+        self.http.request = self.fake_discord.request
+        super()._instrument_http()
+
+    def fake_login(self, guilds: list):
+        """Populate the state as if the gateway sent READY and the guilds."""
+        state = self._connection
+        state.user = discord.ClientUser(state=state,
+                                        data=user_payload(BOT_ID,
+                                                          'lavabot',
+                                                          bot=True))
+        for guild in guilds:
+            state._add_guild_from_data(guild.payload())
+
+        self.ws = FakeGateway()
+        self._ready.set()
+
+    def fake_message(self, guild: FakeGuild, content: str) -> discord.Message:
+        """Return a message as if it was sent by the user of a guild."""
+        channel = self.get_channel(guild.text_channel_id)
+        user = user_payload(guild.user_id, f'user-{guild.id}')
+
+        return discord.Message(state=self._connection,
+                               channel=channel,
+                               data={
+                                   'id': str(next_id()),
+                                   'channel_id': str(channel.id),
+                                   'author': user,
+                                   'member': member_payload(user),
+                                   'content': content,
+                                   'embeds': [],
+                                   'attachments': [],
+                                   'mentions': [],
+                                   'mention_roles': [],
+                                   'mention_everyone': False,
+                                   'pinned': False,
+                                   'tts': False,
+                                   'type': 0,
+                                   'timestamp': datetime.utcnow().isoformat(),
+                                   'edited_timestamp': None
+                               })
+
+    async def fake_reaction(self, guild: FakeGuild, message_id: int,
+                            emoji: str):
+        """Dispatch a reaction of the user of a guild to a message."""
+        member = self.get_guild(guild.id).get_member(guild.user_id)
+        payload = discord.RawReactionActionEvent(
+            {
+                'message_id': str(message_id),
+                'channel_id': str(guild.text_channel_id),
+                'guild_id': str(guild.id),
+                'user_id': str(guild.user_id)
+            }, discord.PartialEmoji(name=emoji), 'REACTION_ADD')
+        payload.member = member
+        self.dispatch('raw_reaction_add', payload)
@@ -0,0 +1,253 @@
+"""Local stand-in for a Lavalink v3 node.
+
+It answers /loadtracks with generated tracks and speaks the websocket
+protocol used by wavelink: play, stop, pause, seek, volume and destroy ops
+are answered with the events a real node would send, and tracks end on
+their own after their (short) length.
+"""
+from aiohttp import web
+import asyncio
+import base64
+import hashlib
+import json
+import time
+
+
+def encode_track(info: dict) -> str:
+    """Return a fake encoded track carrying its info, like lavalink does."""
+    return base64.b64encode(json.dumps(info).encode()).decode()
+
+
+def decode_track(track: str) -> dict:
+    return json.loads(base64.b64decode(track))
+
+
+class FakeLavalink:
+    """Lavalink node serving generated tracks of a few seconds length.
+
+    The gap between a track ending and the next play op arriving is recorded
+    per guild in transition_gaps.
+    """
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 *,
+                 password: str = 'youshallnotpass',
+                 track_length: int = 3000,
+                 search_results: int = 5,
+                 playlist_length: int = 50,
+                 rest_latency: float = 0.005):
+        self.host = host
+        self.port = port
+        self.password = password
+
+        self.track_length = track_length
+        self.search_results = search_results
+        self.playlist_length = playlist_length
+        self.rest_latency = rest_latency
+
+        self.runner: web.AppRunner = None
+        self.sockets = set()
+
+        # Guild id to the player state of the node.
+        self.players = {}
+        self.transition_gaps = []
+        self.load_requests = 0
+
+    @property
+    def rest_uri(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def node_config(self, identifier: str = 'BENCH') -> dict:
+        """Return the lavalink_nodes entry of the bot config for this node."""
+        return {
+            'host': self.host,
+            'identifier': identifier,
+            'password': self.password,
+            'port': self.port,
+            'region': 'eu_central',
+            'rest_uri': self.rest_uri
+        }
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/', self.handle_websocket)
+        app.router.add_get('/loadtracks', self.handle_loadtracks)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+
+        # Pick up the port chosen by the OS.
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for player in self.players.values():
+            if player.get('end_task'):
+                player['end_task'].cancel()
+
+        for ws in list(self.sockets):
+            await ws.close()
+
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def make_track(self, query: str, index: int) -> dict:
+        identifier = hashlib.sha1(f'{query}:{index}'.encode()).hexdigest()[:11]
+        info = {
+            'identifier': identifier,
+            'isSeekable': True,
+            'author': f'Artist {index}',
+            'length': self.track_length,
+            'isStream': False,
+            'position': 0,
+            'title': f'{query} ({index})',
+            'uri': f'https://www.youtube.com/watch?v={identifier}'
+        }
+        return {'track': encode_track(info), 'info': info}
+
+    async def handle_loadtracks(self, request: web.Request) -> web.Response:
+        if request.headers.get('Authorization') != self.password:
+            return web.Response(status=401)
+
+        self.load_requests += 1
+        await asyncio.sleep(self.rest_latency)
+
+        query = request.query.get('identifier', '')
+        if query.startswith('ytsearch:'):
+            count = self.search_results
+            data = {'loadType': 'SEARCH_RESULT', 'playlistInfo': {}}
+        elif 'playlist' in query:
+            count = self.playlist_length
+            data = {
+                'loadType': 'PLAYLIST_LOADED',
+                'playlistInfo': {
+                    'name': query,
+                    'selectedTrack': -1
+                }
+            }
+        else:
+            count = 1
+            data = {'loadType': 'TRACK_LOADED', 'playlistInfo': {}}
+
+        data['tracks'] = [self.make_track(query, i) for i in range(count)]
+        return web.json_response(data)
+
+    async def handle_websocket(self, request: web.Request):
+        if request.headers.get('Authorization') != self.password:
+            return web.Response(status=401)
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+
+        stats_task = asyncio.ensure_future(self.send_stats(ws))
+        try:
+            async for message in ws:
+                data = json.loads(message.data)
+                handler = getattr(self, f'op_{data["op"]}', None)
+                if handler is not None:
+                    await handler(ws, data)
+        finally:
+            stats_task.cancel()
+            self.sockets.discard(ws)
+
+        return ws
+
+    async def send_stats(self, ws: web.WebSocketResponse):
+        while not ws.closed:
+            playing = sum(1 for x in self.players.values() if x.get('track'))
+            await ws.send_json({
+                'op': 'stats',
+                'players': len(self.players),
+                'playingPlayers': playing,
+                'uptime': int(time.monotonic() * 1000),
+                'memory': {
+                    'free': 0,
+                    'used': 0,
+                    'allocated': 0,
+                    'reservable': 0
+                },
+                'cpu': {
+                    'cores': 1,
+                    'systemLoad': 0,
+                    'lavalinkLoad': 0
+                }
+            })
+            await asyncio.sleep(5)
+
+    async def send_event(self, ws: web.WebSocketResponse, guild_id: str,
+                         event_type: str, track: str, **kwargs):
+        if ws.closed:
+            return
+        await ws.send_json({
+            'op': 'event',
+            'type': event_type,
+            'guildId': guild_id,
+            'track': track,
+            **kwargs
+        })
+
+    def _player(self, guild_id: str) -> dict:
+        return self.players.setdefault(guild_id, {})
+
+    async def _end_track(self, ws, guild_id: str, reason: str):
+        player = self._player(guild_id)
+        track = player.pop('track', None)
+        task = player.pop('end_task', None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+        if track is not None:
+            if reason != 'REPLACED':
+                player['ended_at'] = time.perf_counter()
+            await self.send_event(ws, guild_id, 'TrackEndEvent', track,
+                                  reason=reason)
+
+    async def _finish_later(self, ws, guild_id: str, delay: float):
+        await asyncio.sleep(delay)
+        await self._end_track(ws, guild_id, 'FINISHED')
+
+    async def op_play(self, ws, data: dict):
+        guild_id = data['guildId']
+        player = self._player(guild_id)
+
+        if player.get('track') is not None:
+            if data.get('noReplace'):
+                return
+            await self._end_track(ws, guild_id, 'REPLACED')
+
+        ended_at = player.pop('ended_at', None)
+        if ended_at is not None:
+            self.transition_gaps.append(time.perf_counter() - ended_at)
+
+        info = decode_track(data['track'])
+        start = int(data.get('startTime', 0))
+        player['track'] = data['track']
+        player['end_task'] = asyncio.ensure_future(
+            self._finish_later(ws, guild_id,
+                               max(0, info['length'] - start) / 1000))
+
+        await self.send_event(ws, guild_id, 'TrackStartEvent', data['track'])
+
+    async def op_stop(self, ws, data: dict):
+        await self._end_track(ws, data['guildId'], 'STOPPED')
+
+    async def op_destroy(self, ws, data: dict):
+        player = self.players.pop(data['guildId'], {})
+        if player.get('end_task'):
+            player['end_task'].cancel()
+
+    async def op_pause(self, ws, data: dict):
+        pass
+
+    async def op_seek(self, ws, data: dict):
+        pass
+
+    async def op_volume(self, ws, data: dict):
+        pass
+
+    async def op_voiceUpdate(self, ws, data: dict):
+        pass
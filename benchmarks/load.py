@@ -0,0 +1,235 @@
+"""Simulate guilds using the music commands against fake Discord and Lavalink.
+
+Every simulated guild starts a playlist and then keeps issuing play, skip,
+queue and shuffle commands while its tracks end on the fake node. At the
+end the command throughput and latencies, the gaps between tracks and the
+memory used per guild are reported.
+
+Run with ``python -m benchmarks.load [--guilds 20] [--duration 20]`` from
+the repository root.
+"""
+import argparse
+import asyncio
+from .fake_discord import BenchBot, FakeGuild
+from .fake_lavalink import FakeLavalink
+import config
+import copy
+import discord
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+COMMANDS = {'play': 4, 'skip': 2, 'queue': 2, 'shuffle': 2}
+QUEUE_STOP_EMOJI = '\N{BLACK SQUARE FOR STOP}\ufe0f'
+
+
+def percentile(values: list, q: float) -> float:
+    """Return the q-th percentile of values with linear interpolation."""
+    if not values:
+        return float('nan')
+
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def memory_usage() -> int:
+    """Return the bytes allocated by Python if traced, else the resident set size."""
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Peak instead of current usage, in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadGenerator:
+
+    def __init__(self, bot: BenchBot, guilds: list, *, think_time: float):
+        self.bot = bot
+        self.guilds = guilds
+        self.think_time = think_time
+
+        # Command name to the latencies in seconds.
+        self.latencies = {x: [] for x in COMMANDS}
+
+    async def command(self, guild: FakeGuild, name: str, argument: str = ''):
+        message = self.bot.fake_message(
+            guild, f'{self.bot.command_prefix}{name} {argument}'.strip())
+        start = time.perf_counter()
+
+        if name != 'queue':
+            await self.bot.process_commands(message)
+            self.latencies[name].append(time.perf_counter() - start)
+            return
+
+        # The queue menu stays open until its stop button is pressed, the
+        # latency is the time until the first page is shown.
+        response = self.bot.fake_discord.wait_for_message(
+            lambda x: x['channel_id'] == str(guild.text_channel_id) and
+            (x['content'] == 'The queue is empty.' or any(
+                e.get('title') == 'Queue' for e in x['embeds'])))
+        task = self.bot.loop.create_task(self.bot.process_commands(message))
+
+        done, _ = await asyncio.wait({response, task},
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if response not in done:
+            response.cancel()
+            self.latencies[name].append(time.perf_counter() - start)
+            return
+
+        self.latencies[name].append(time.perf_counter() - start)
+        data = response.result()
+
+        # Press stop until the menu listens for reactions and closes.
+        while not task.done():
+            await self.bot.fake_reaction(guild, int(data['id']),
+                                         QUEUE_STOP_EMOJI)
+            await asyncio.wait({task}, timeout=0.05)
+
+    async def simulate(self, guild: FakeGuild, deadline: float):
+        await self.command(guild, 'play',
+                           f'https://example.com/playlist/{guild.id}')
+
+        names = list(COMMANDS)
+        weights = list(COMMANDS.values())
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(random.expovariate(1 / self.think_time))
+
+            name = random.choices(names, weights)[0]
+            if name == 'play':
+                await self.command(guild, 'play',
+                                   f'song {random.randrange(1000)}')
+            else:
+                await self.command(guild, name)
+
+    async def run(self, duration: float):
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[self.simulate(x, deadline) for x in self.guilds])
+
+
+async def wait_for_node(bot: BenchBot, timeout: float = 10):
+    end = time.perf_counter() + timeout
+    while time.perf_counter() < end:
+        wavelink = getattr(bot, 'wavelink', None)
+        if wavelink and any(x.is_available for x in wavelink.nodes.values()):
+            return
+        await asyncio.sleep(0.05)
+    raise RuntimeError('The bot did not connect to the fake lavalink node')
+
+
+async def run(args: argparse.Namespace):
+    lavalink = FakeLavalink(track_length=args.track_length,
+                            playlist_length=args.playlist_length,
+                            rest_latency=args.lavalink_latency)
+    await lavalink.start()
+
+    directory = tempfile.TemporaryDirectory()
+
+    cfg = copy.deepcopy(config.default_config)
+    cfg['lavalink_nodes'] = [lavalink.node_config()]
+    cfg['persistence']['path'] = os.path.join(directory.name, 'players.db')
+
+    bot = BenchBot(command_prefix='$',
+                   help_command=None,
+                   intents=discord.Intents.all(),
+                   discord_latency=args.discord_latency)
+    bot.config = cfg
+    bot.owner_id = 0
+
+    guilds = [FakeGuild(i) for i in range(args.guilds)]
+    bot.fake_login(guilds)
+    bot.load_extension('cogs.music')
+    await wait_for_node(bot)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    memory_before = memory_usage()
+
+    generator = LoadGenerator(bot, guilds, think_time=args.think_time)
+    start = time.perf_counter()
+    await generator.run(args.duration)
+    elapsed = time.perf_counter() - start
+
+    memory_after = memory_usage()
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    report(args, generator, lavalink, bot, elapsed,
+           (memory_after - memory_before) / len(guilds))
+
+    for player in list(bot.wavelink.players.values()):
+        await player.destroy()
+    bot.unload_extension('cogs.music')
+    for node in list(bot.wavelink.nodes.values()):
+        await node.destroy()
+    await bot.wavelink.session.close()
+    await lavalink.stop()
+    directory.cleanup()
+
+
+def report(args, generator: LoadGenerator, lavalink: FakeLavalink,
+           bot: BenchBot, elapsed: float, memory_per_guild: float):
+    latencies = [x for values in generator.latencies.values() for x in values]
+
+    print(f'{args.guilds} guilds for {elapsed:.1f} s, '
+          f'{len(latencies)} commands, {len(latencies) / elapsed:.1f} commands/s')
+    print()
+    print(f'{"command":<10}{"count":>8}{"p50 ms":>10}{"p99 ms":>10}')
+    for name, values in list(generator.latencies.items()) + [('all',
+                                                               latencies)]:
+        print(f'{name:<10}{len(values):>8}'
+              f'{percentile(values, 50) * 1000:>10.1f}'
+              f'{percentile(values, 99) * 1000:>10.1f}')
+    print()
+
+    gaps = lavalink.transition_gaps
+    print(f'track transitions: {len(gaps)}, gap p50 '
+          f'{percentile(gaps, 50) * 1000:.1f} ms, p99 '
+          f'{percentile(gaps, 99) * 1000:.1f} ms')
+    print(f'loadtracks requests: {lavalink.load_requests}, '
+          f'discord requests: {bot.fake_discord.requests}')
+    print(f'memory per guild: {memory_per_guild / 1024:.1f} KiB '
+          f'({"traced" if args.tracemalloc else "resident set size"})')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--duration',
+                        type=float,
+                        default=20,
+                        help='seconds to generate load for')
+    parser.add_argument('--think-time',
+                        type=float,
+                        default=0.5,
+                        help='mean seconds between commands of a guild')
+    parser.add_argument('--track-length',
+                        type=int,
+                        default=3000,
+                        help='length of the fake tracks in milliseconds')
+    parser.add_argument('--playlist-length', type=int, default=50)
+    parser.add_argument('--discord-latency', type=float, default=0.01)
+    parser.add_argument('--lavalink-latency', type=float, default=0.005)
+    parser.add_argument('--tracemalloc',
+                        action='store_true',
+                        help='measure memory with tracemalloc, which slows '
+                        'everything down')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
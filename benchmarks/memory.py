@@ -0,0 +1,93 @@
+"""Compare the memory used by queues of full tracks and of compact entries.
+
+Run with ``python -m benchmarks.memory [count]`` from the repository root.
+"""
+import base64
+from cogs.music.track import QueueEntry, Track
+from datetime import datetime
+import gc
+import random
+import string
+import sys
+import tracemalloc
+
+
+class FakeMember:
+    """Stand-in for the discord.Member that requested a track."""
+
+    def __init__(self, id_: int):
+        self.id = id_
+
+
+def make_track_data(index: int) -> dict:
+    """Return a track like it is returned by the lavalink REST API."""
+    identifier = ''.join(random.choices(string.ascii_letters + string.digits,
+                                        k=11))
+    title = f'Artist {index} - Some Song Title ({index}) [Official Video]'
+    uri = f'https://www.youtube.com/watch?v={identifier}'
+    encoded = base64.b64encode(
+        f'{title}\0Artist {index}\0{identifier}\0{uri}'.encode()).decode()
+
+    return {
+        'track': encoded,
+        'info': {
+            'identifier': identifier,
+            'isSeekable': True,
+            'author': f'Artist {index}',
+            'length': random.randint(60_000, 600_000),
+            'isStream': False,
+            'position': 0,
+            'title': title,
+            'uri': uri
+        }
+    }
+
+
+def measure(build) -> int:
+    """Return the bytes retained by the objects a function builds."""
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main(count: int):
+    random.seed(0)
+    data = [make_track_data(i) for i in range(count)]
+    members = [FakeMember(10**17 + i) for i in range(10)]
+
+    # Every representation gets its own copy of the data, just like the
+    # tracks returned by the REST API.
+    def build_tracks():
+        return [
+            Track(x['track'],
+                  dict(x['info']),
+                  requester=members[i % len(members)],
+                  requested_at=datetime.utcnow()) for i, x in enumerate(data)
+        ]
+
+    def build_entries():
+        return [
+            QueueEntry(x['track'], dict(x['info']),
+                       members[i % len(members)].id,
+                       int(datetime.utcnow().timestamp()))
+            for i, x in enumerate(data)
+        ]
+
+    # The strings are shared by both, so only the objects are counted.
+    tracks = measure(build_tracks)
+    entries = measure(build_entries)
+
+    print(f'{count} queue entries')
+    print(f'{"Track":<12}{tracks / 1024:>12.1f} KiB'
+          f'{tracks / count:>10.0f} B/entry')
+    print(f'{"QueueEntry":<12}{entries / 1024:>12.1f} KiB'
+          f'{entries / count:>10.0f} B/entry')
+    print(f'Saved {(1 - entries / tracks) * 100:.0f}%')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,251 @@
+"""Microbenchmarks of the pure Python hot paths of the music cog.
+
+Every case reports the operations per second (best of several rounds) and
+the peak memory allocated by one operation. The results can be saved as
+the baseline and later runs compared against it:
+
+    python -m benchmarks.micro --save       # write benchmarks/baseline.json
+    python -m benchmarks.micro --compare    # compare with the baseline
+
+Comparing exits with status 1 if a case got slower than the threshold.
+The baseline is only meaningful on the machine that recorded it.
+"""
+import argparse
+from .memory import FakeMember, make_track_data
+from cogs.music import converters
+from cogs.music.music import QueuePageSource
+from cogs.music.player import Player
+from cogs.music.queue import FairQueue, TrackQueue
+from cogs.music.track import QueueEntry, Track
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Minimum seconds every round runs for.
+ROUND_TIME = 0.2
+ROUNDS = 5
+
+
+class FakeRequester(FakeMember):
+    avatar_url = 'https://cdn.discordapp.com/embed/avatars/0.png'
+
+    def __str__(self):
+        return f'user#{self.id % 10000:04d}'
+
+
+def run_coroutine(coro):
+    """Run a coroutine that never suspends to completion."""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('The coroutine suspended')
+
+
+def make_tracks(count: int) -> list:
+    requesters = [FakeRequester(10**17 + i) for i in range(10)]
+    return [
+        Track(x['track'], x['info'], requester=requesters[i % 10])
+        for i, x in enumerate(make_track_data(i) for i in range(count))
+    ]
+
+
+def make_entries(count: int) -> list:
+    return [QueueEntry.from_track(x) for x in make_tracks(count)]
+
+
+def bench_parse_timedelta():
+    arguments = ['1h2m3s', '45s', '3m', '1w2d3h4m5s', 'invalid']
+    return lambda: [converters.parse_timedelta(x) for x in arguments]
+
+
+def bench_format_timedelta():
+    durations = [1_000, 59_999, 61_000, 3_600_000, 86_399_999]
+    return lambda: [
+        converters.format_timedelta(milliseconds=x) for x in durations
+    ]
+
+
+def bench_queue_page():
+    player = types.SimpleNamespace(queue=TrackQueue(make_entries(10_000)))
+    source = QueuePageSource(player)
+    menu = types.SimpleNamespace(current_page=source.get_max_pages() // 2)
+
+    async def format_page():
+        entries = await source.get_page(menu.current_page)
+        return await source.format_page(menu, entries)
+
+    return lambda: run_coroutine(format_page())
+
+
+def bench_track_batch():
+    data = [make_track_data(i) for i in range(1_000)]
+    requester = FakeRequester(10**17)
+    return lambda: [
+        Track(x['track'], x['info'], requester=requester) for x in data
+    ]
+
+
+def bench_entry_batch():
+    data = [make_track_data(i) for i in range(1_000)]
+    return lambda: [
+        QueueEntry(x['track'], x['info'], 10**17, 1600000000) for x in data
+    ]
+
+
+def bench_shuffle_queue():
+    queue = TrackQueue(make_entries(10_000))
+    return queue.shuffle
+
+
+def bench_shuffle_fair_queue():
+    entries = make_entries(10_000)
+    return FairQueue(entries).shuffle
+
+
+def bench_now_playing_embed():
+    bot = types.SimpleNamespace(loop=None)
+    player = Player(bot, 1, None)
+    player.current = make_tracks(1)[0]
+    player.channel_id = 1
+    player.repeat_one = True
+
+    return lambda: player._now_playing_embed().to_dict()
+
+
+CASES = {
+    'converters.parse_timedelta': bench_parse_timedelta,
+    'converters.format_timedelta': bench_format_timedelta,
+    'QueuePageSource.format_page': bench_queue_page,
+    'Track batch of 1000': bench_track_batch,
+    'QueueEntry batch of 1000': bench_entry_batch,
+    'TrackQueue.shuffle of 10000': bench_shuffle_queue,
+    'FairQueue.shuffle of 10000': bench_shuffle_fair_queue,
+    'Player now playing embed': bench_now_playing_embed,
+}
+
+
+def measure(function) -> dict:
+    """Return the operations per second and peak bytes per operation of a function."""
+    # Find the number of calls that takes at least one round time.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= ROUND_TIME:
+            break
+        number = max(number * 2,
+                     int(number * ROUND_TIME * 1.1 / max(elapsed, 1e-9)))
+
+    best = elapsed
+    for _ in range(ROUNDS - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {'ops_per_sec': number / best, 'peak_bytes': peak}
+
+
+def run(names: list) -> dict:
+    results = {}
+    for name in names:
+        random.seed(0)
+        results[name] = measure(CASES[name]())
+        print(f'{name:<32}{results[name]["ops_per_sec"]:>14,.1f} ops/s'
+              f'{results[name]["peak_bytes"] / 1024:>12,.1f} KiB/op')
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print the changes to the baseline and return whether nothing regressed."""
+    print()
+    print(f'{"case":<32}{"ops/s":>10}{"KiB/op":>10}')
+
+    ok = True
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'{name:<32}{"new":>10}')
+            continue
+
+        speed = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        memory = (result['peak_bytes'] - before['peak_bytes']) / 1024
+        regressed = speed < -threshold / 100
+        ok = ok and not regressed
+
+        print(f'{name:<32}{speed * 100:>+9.1f}%{memory:>+10.1f}'
+              f'{"  slower" if regressed else ""}')
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save',
+                        action='store_true',
+                        help='save the results as the baseline')
+    parser.add_argument('--compare',
+                        action='store_true',
+                        help='compare the results with the baseline')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=10,
+                        help='percent of slowdown counted as a regression')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('cases',
+                        nargs='*',
+                        help='names of the cases to run, all by default')
+    args = parser.parse_args(argv)
+
+    names = args.cases or list(CASES)
+    unknown = [x for x in names if x not in CASES]
+    if unknown:
+        parser.error(f'unknown cases: {", ".join(unknown)}')
+
+    results = run(names)
+
+    ok = True
+    if args.compare:
+        with open(args.baseline) as file:
+            ok = compare(results, json.load(file), args.threshold)
+
+    if args.save:
+        # Cases that were not run keep their saved results.
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                saved = json.load(file)['results']
+        saved.update(results)
+
+        with open(args.baseline, 'w') as file:
+            json.dump(
+                {
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'results': saved
+                },
+                file,
+                indent=2,
+                sort_keys=True)
+            file.write('\n')
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,170 @@
 from discord.ext import commands
 from cogs.music import errors
+import discord
+from expiry import MessageExpiry
+from functools import wraps
+import logging
+from loop_watchdog import LoopWatchdog
+import metrics
 import sys
+import time
 import traceback
 import wavelink
 
 
 class Context(commands.Context):
 
+    # When the message was received, set by Bot.get_context.
+    started_at: float = None
+
     async def send(self, content=None, *, both=True, **kwargs):
+        delete_after = kwargs.pop('delete_after', None)
         ret = await super().send(content=content, **kwargs)
-        delete_after = kwargs.get('delete_after', None)
-        if delete_after is not None and both:
-            await self.message.delete(delay=delete_after)
+        if delete_after is not None:
+            self.bot.expiry.schedule(ret, delete_after)
+            if both:
+                self.bot.expiry.schedule(self.message, delete_after)
         return ret
 
 
 class Bot(commands.Bot):
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.expiry = MessageExpiry(self.loop)
+
+        self.metrics = metrics.Registry()
+        self.metrics_server: metrics.MetricsServer = None
+        self.watchdog: LoopWatchdog = None
+        self._instrument_http()
+
+        # Name of the extension being reloaded, so cogs can hand over state.
+        self.reloading_extension: str = None
+        # The last started command or event, reported by the watchdog.
+        self.current_activity: str = None
+
+    def _instrument_http(self):
+        """Count the Discord REST requests and their rate limits."""
+        requests = self.metrics.counter(
+            'lavabot_discord_requests_total',
+            'Discord REST requests by method, route and status.',
+            ('method', 'route', 'status'))
+        duration = self.metrics.histogram(
+            'lavabot_discord_request_duration_seconds',
+            'Duration of Discord REST requests including rate limit waits.',
+            ('method',))
+
+        request = self.http.request
+
+        @wraps(request)
+        async def instrumented_request(route, **kwargs):
+            status = 'error'
+            start = time.perf_counter()
+            try:
+                ret = await request(route, **kwargs)
+                status = '2xx'
+                return ret
+            except discord.HTTPException as e:
+                status = str(e.status)
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start, route.method)
+                requests.inc(route.method, route.path, status)
+
+        self.http.request = instrumented_request
+
+        rate_limits = self.metrics.counter(
+            'lavabot_discord_rate_limits_total',
+            'Discord rate limits hit, by bucket or global.', ('scope',))
+        logging.getLogger('discord.http').addHandler(
+            metrics.RateLimitHandler(rate_limits))
+
+    async def start(self, *args, **kwargs):
+        metrics_config = self.config.get('metrics', {})
+        if metrics_config.get('enabled', False):
+            self.metrics_server = metrics.MetricsServer(
+                self.metrics, metrics_config.get('host', '127.0.0.1'),
+                metrics_config.get('port', 9100))
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                # The bot runs without the endpoint, e.g. if the port is taken.
+                print(f'Could not serve the metrics: {e}', file=sys.stderr)
+                await self.metrics_server.stop()
+                self.metrics_server = None
+
+        watchdog_config = self.config.get('watchdog', {})
+        if watchdog_config.get('enabled', True):
+            self.watchdog = LoopWatchdog(
+                self.loop,
+                interval=watchdog_config.get('interval', 0.25),
+                threshold=watchdog_config.get('threshold', 0.5),
+                activity=lambda: self.current_activity,
+                metrics=self.metrics)
+            self.watchdog.start()
+
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+
+        await super().close()
+
+    def _clear_help_cache(self):
+        clear_cache = getattr(self.help_command, 'clear_cache', None)
+        if clear_cache is not None:
+            clear_cache()
+
+    def load_extension(self, name):
+        super().load_extension(name)
+        self._clear_help_cache()
+
+    def unload_extension(self, name):
+        super().unload_extension(name)
+        self._clear_help_cache()
+
+    def reload_extension(self, name):
+        # Also cleared if the reload failed and the old module was restored.
+        self.reloading_extension = name
+        try:
+            super().reload_extension(name)
+        finally:
+            self.reloading_extension = None
+            self._clear_help_cache()
+
     async def get_context(self, message, *, cls=Context):
-        return await super().get_context(message, cls=cls)
+        started_at = time.perf_counter()
+        ctx = await super().get_context(message, cls=cls)
+        ctx.started_at = started_at
+        return ctx
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        # Runs every event handler, unlike dispatch it is not also called
+        # for the command event while the command runs.
+        self.current_activity = f'event {event_name}'
+        await super()._run_event(coro, event_name, *args, **kwargs)
+
+    async def invoke(self, ctx: commands.Context):
+        if ctx.command is not None:
+            self.current_activity = f'command {ctx.command.qualified_name}'
+        await super().invoke(ctx)
+
+        if ctx.command is None or ctx.started_at is None:
+            return
+
+        name = ctx.command.qualified_name
+        self.metrics.histogram(
+            'lavabot_command_duration_seconds',
+            'Time from receiving a command message to finishing the command.',
+            ('command',)).observe(time.perf_counter() - ctx.started_at, name)
+        if ctx.command_failed:
+            self.metrics.counter('lavabot_command_errors_total',
+                                 'Commands that raised an error.',
+                                 ('command',)).inc(name)
 
     async def on_command_error(self, ctx: commands.Context,
                                exception: commands.CommandError):
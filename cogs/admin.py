@@ -1,5 +1,6 @@
 import discord
 from discord.ext import commands, menus
+import time
 
 # class Confirm(menus.Menu):
 
@@ -40,12 +41,51 @@ class Admin(commands.Cog):
 
         await ctx.bot.change_presence(status=discord.Status.offline)
 
+        # Save and stop the players, they are restored on the next start.
         music_cog = ctx.bot.get_cog('Music')
         if music_cog:
-            await music_cog.stop_nodes()
+            await music_cog.drain()
 
         await ctx.bot.logout()
 
+    @commands.command()
+    @commands.is_owner()
+    async def nodes(self, ctx: commands.Context):
+        """Show the health of the lavalink nodes."""
+        client = getattr(ctx.bot, 'wavelink', None)
+        nodes = client.nodes if client else {}
+        music_cog = ctx.bot.get_cog('Music')
+        now = time.time()
+
+        embed = discord.Embed(title='Nodes')
+        for node_config in ctx.bot.config.get('lavalink_nodes', []):
+            identifier = node_config['identifier']
+            node = nodes.get(identifier)
+
+            if node is None:
+                lines = [':black_circle: Not connected']
+            elif node.is_available:
+                lines = [':green_circle: Available']
+            else:
+                lines = [':red_circle: Unavailable']
+                down_since = music_cog and music_cog.node_down_since.get(
+                    identifier)
+                if down_since:
+                    lines[0] += f' for {int(now - down_since)} seconds'
+
+            if node is not None:
+                lines.append(f'Players: {len(node.players)}')
+                if node.stats:
+                    lines.append(
+                        f'Playing: {node.stats.playing_players}, '
+                        f'load: {node.stats.system_load:.0%}')
+
+            embed.add_field(name=identifier,
+                            value='\n'.join(lines),
+                            inline=False)
+
+        await ctx.send(embed=embed, delete_after=30)
+
     @commands.command()
     @commands.is_owner()
     async def reload(self, ctx: commands.Context, extension: str):
@@ -0,0 +1,51 @@
+import discord
+import typing
+import wavelink
+
+
+def normalize_region(region) -> str:
+    """Return a region name comparable between discord and the node config."""
+    return str(region).lower().replace('-', '_')
+
+
+def node_penalty(node: wavelink.Node,
+                 region: str = None,
+                 *,
+                 region_penalty: float = 100) -> float:
+    """Return the load score of a node, lower is better.
+
+    The score follows the lavalink load balancing penalties for CPU load
+    and nulled or missing frames. Lavalink only sends stats once a minute,
+    so the playing players reported there are replaced with the players
+    currently placed on the node.
+    """
+    penalty = len(node.players)
+
+    stats = node.stats
+    if stats is not None:
+        penalty += stats.penalty.total - stats.penalty.player_penalty
+
+    if region is not None and normalize_region(node.region) != region:
+        penalty += region_penalty
+
+    return penalty
+
+
+def select_node(client: wavelink.Client,
+                guild: discord.Guild = None,
+                *,
+                region_penalty: float = 100,
+                exclude: typing.Container[str] = ()) -> wavelink.Node:
+    """Return the available node with the lowest penalty for a guild or None."""
+    region = normalize_region(guild.region) if guild is not None else None
+
+    nodes = [
+        node for node in client.nodes.values()
+        if node.is_available and node.identifier not in exclude
+    ]
+    if not nodes:
+        return None
+
+    return min(nodes,
+               key=lambda n: node_penalty(
+                   n, region, region_penalty=region_penalty))
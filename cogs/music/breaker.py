@@ -0,0 +1,48 @@
+import time
+
+
+class CircuitBreaker:
+    """Stop sending requests to a node after repeated failures.
+
+    After `threshold` consecutive failures the breaker opens and rejects
+    requests for `reset_timeout` seconds. Then a single trial request is let
+    through which either closes the breaker again or reopens it.
+    """
+
+    def __init__(self, *, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """Return 'closed', 'open' or 'half-open'."""
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent."""
+        state = self.state
+        return state == 'closed' or (state == 'half-open' and not self._trial)
+
+    def record_attempt(self):
+        """Mark a request as sent, using up the trial of a half-open breaker."""
+        if self.state == 'half-open':
+            self._trial = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial = False
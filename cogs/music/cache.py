@@ -0,0 +1,87 @@
+from collections import OrderedDict
+import time
+
+
+class TTLCache:
+    """Bounded mapping with least recently used eviction and expiring entries.
+
+    The size of the cache is the sum of the weights of its values, one per
+    value unless a weigh function is given. Values heavier than the maximum
+    size are not stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, *, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh
+
+        self.hits = 0
+        self.misses = 0
+
+        # The sum of the weights of the stored values.
+        self.weight = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        try:
+            expires_at, _, _ = self._data[key]
+        except KeyError:
+            return False
+        return expires_at > time.monotonic()
+
+    def keys(self):
+        """Return the stored keys, including expired ones."""
+        return list(self._data.keys())
+
+    def get(self, key, default=None):
+        """Return the value for a key and mark it as recently used."""
+        try:
+            expires_at, value, _ = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, *, ttl: float = None):
+        """Store a value, evicting the least recently used entries if full."""
+        if ttl is None:
+            ttl = self.ttl
+
+        self.pop(key)
+
+        weight = self.weigh(value) if self.weigh else 1
+        if weight > self.maxsize:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value, weight)
+        self.weight += weight
+
+        while self.weight > self.maxsize:
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.weight -= evicted
+
+    def pop(self, key, default=None):
+        """Remove a key and return its value."""
+        try:
+            _, value, weight = self._data.pop(key)
+        except KeyError:
+            return default
+
+        self.weight -= weight
+        return value
+
+    def clear(self):
+        """Remove all entries."""
+        self._data.clear()
+        self.weight = 0
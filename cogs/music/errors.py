@@ -4,3 +4,8 @@ from discord.ext import commands
 class CancelExecution(commands.CommandError):
     """Error raised when a command should be stopped from executing any further."""
     pass
+
+
+class TrackLoadError(commands.CommandError):
+    """Error raised when tracks could not be loaded from any lavalink node."""
+    pass
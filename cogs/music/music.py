@@ -1,47 +1,111 @@
-from . import converters
+import asyncio
+from . import balancer, converters
 import datetime
 import discord
 from discord.ext import commands, menus
-from .errors import CancelExecution
+from .errors import CancelExecution, TrackLoadError
 from functools import reduce
 import math
+import sys
+import time
 from .player import Player
-import random
-from .track import Track
+from .privileges import PrivilegeCache
+from .queue import FairQueue, TrackQueue
+from .reactions import ReactionRouter, RoutedMenu, RoutedMenuPages
+from .resolver import TrackResolver
+from .store import PlayerStore
+import traceback
+from .track import entry_from_dict, PendingEntry, QueueEntry, Track
 import typing
 import validators
 import wavelink
 
 
-class QueuePageSource(menus.ListPageSource):
+class QueuePageSource(menus.PageSource):
+    """Pages of a player's queue, read from the queue when they are shown.
 
-    def __init__(self, entries):
-        super().__init__(entries, per_page=15)
+    Only the entries of the shown page are accessed and the number of pages
+    follows the current length of the queue.
+    """
 
-    async def format_page(self, menu, page_entries):
-        offset = menu.current_page * self.per_page
+    per_page = 15
+
+    def __init__(self, player: Player):
+        self.player = player
+
+    @property
+    def queue(self):
+        return self.player.queue
+
+    @property
+    def version(self) -> tuple:
+        """Return a value that changes whenever the queue changes."""
+        return id(self.queue), self.queue.version
+
+    def is_paginating(self):
+        return len(self.queue) > self.per_page
+
+    def get_max_pages(self):
+        return max(1, math.ceil(len(self.queue) / self.per_page))
+
+    async def get_page(self, page_number):
+        page_number = min(page_number, self.get_max_pages() - 1)
+        offset = page_number * self.per_page
+        return offset, self.queue[offset:offset + self.per_page]
+
+    async def format_page(self, menu, page):
+        offset, page_entries = page
         tracks = [
-            f'{i+1}. [{x.title}]({x.uri})'
+            f'{i+1}. [{x.title}]({x.uri})' if x.uri else f'{i+1}. {x.title}'
             for i, x in enumerate(page_entries, start=offset)
         ]
-        text = '\n'.join(tracks)
+        text = '\n'.join(tracks) or 'The queue is empty.'
 
         if len(text) >= 2048:
             return ':x: An error occured.'
 
         embed = discord.Embed(title='Queue', description=text)
-        embed.set_footer(
-            text=
-            'The queue entries could change while this message is displayed.')
         if self.is_paginating():
             embed.add_field(name='Queue Length',
-                            value=len(self.entries),
+                            value=len(self.queue),
                             inline=True)
+            embed.set_footer(
+                text=f'Page {offset // self.per_page + 1} of '
+                f'{self.get_max_pages()}')
 
         return embed
 
 
-class Vote(menus.Menu):
+class QueueMenu(RoutedMenuPages):
+    """Queue pages that are rendered again when the queue changes."""
+
+    # Seconds between checks of the queue for changes.
+    REFRESH_INTERVAL = 2
+
+    async def _internal_loop(self):
+        task = self.bot.loop.create_task(self._refresh_loop())
+        try:
+            await super()._internal_loop()
+        finally:
+            task.cancel()
+
+    async def _refresh_loop(self):
+        version = self.source.version
+        while self._running:
+            await asyncio.sleep(self.REFRESH_INTERVAL)
+            if self.source.version == version:
+                continue
+
+            version = self.source.version
+            page_number = min(self.current_page,
+                              self.source.get_max_pages() - 1)
+            try:
+                await self.show_page(page_number)
+            except discord.HTTPException:
+                return
+
+
+class Vote(RoutedMenu):
 
     def __init__(self, text: str, *, threshold: int, timeout: int):
         super().__init__(timeout=timeout, delete_message_after=True)
@@ -118,21 +182,43 @@ class Vote(menus.Menu):
         return self.count >= self.threshold
 
 
-async def is_privileged(ctx: commands.Context) -> bool:
-    """Check whether the user is the bot owner, an admin or a DJ."""
-    member = ctx.author
-    guild = member.guild
+def search_query(query: str) -> str:
+    """Return the lavalink identifier for a URL or a YouTube search."""
+    if not validators.url(query):
+        return f'ytsearch:{query}'
+    return query
+
+
+def result_tracks(result) -> list:
+    """Return all tracks of a playlist or the first track of a search result."""
+    if isinstance(result, wavelink.TrackPlaylist):
+        return result.tracks
+    if result:
+        return result[:1]
+    return []
 
-    if guild.owner == member:
-        return True
 
-    app_info = await ctx.bot.application_info()
-    if member == app_info.owner:
+def adopt_class(obj, classes: dict) -> bool:
+    """Switch an object to the class of the same name, return whether it has it.
+
+    Objects created before a reload keep the classes of the old modules.
+    The switch fails if the class changed its slots.
+    """
+    cls = classes.get(type(obj).__name__)
+    if cls is None or isinstance(obj, cls):
         return True
 
-    role_id = ctx.bot.config.get('dj_roles', {}).get(str(guild.id))
-    role = guild.get_role(role_id)
-    if role and member in role.members:
+    try:
+        obj.__class__ = cls
+    except TypeError:
+        return False
+    return True
+
+
+async def is_privileged(ctx: commands.Context) -> bool:
+    """Check whether the user is the bot owner, an admin or a DJ."""
+    cog = ctx.bot.get_cog('Music')
+    if await cog.privileges.is_privileged(ctx.author):
         return True
 
     raise commands.CheckFailure('You are not allowed to use this command.')
@@ -141,58 +227,485 @@ async def is_privileged(ctx: commands.Context) -> bool:
 class Music(commands.Cog, wavelink.WavelinkMixin):
     """Use this bot to play music in a voice channel."""
 
+    # The maximum number of queries of the playmany command.
+    BULK_LIMIT = 50
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
         if not hasattr(bot, 'wavelink'):
             bot.wavelink = wavelink.Client(bot=bot)
 
-        bot.loop.create_task(self.start_nodes())
+        self.resolver = TrackResolver.from_config(bot.wavelink,
+                                                  bot.config,
+                                                  metrics=bot.metrics)
+        self.privileges = PrivilegeCache(bot,
+                                         **bot.config.get('privilege_cache', {}))
+
+        self.node_down_since = {}
+
+        # Taken over from the previous instance after a reload.
+        self.store: PlayerStore = None
+        self.persisted = set()
+        # Saved players that had no node available, by guild ID.
+        self.unrestored = {}
+        self.persist_task = None
+
+        self.import_tasks = set()
+        # Set while shutting down, no further tracks are started.
+        self.draining = False
+
+        ReactionRouter.install(bot)
+
+        self.gauges = [
+            bot.metrics.gauge('lavabot_players', 'Connected players by node.',
+                              ('node',)),
+            bot.metrics.gauge('lavabot_queue_entries',
+                              'Queued entries of all players.'),
+            bot.metrics.gauge('lavabot_queue_length_max',
+                              'Length of the longest queue.')
+        ]
+        for gauge, function in zip(self.gauges,
+                                   (self.count_players,
+                                    self.count_queue_entries,
+                                    self.max_queue_length)):
+            gauge.set_function(function)
+
+        # Left on the bot by the previous instance if the extension was reloaded.
+        handover = getattr(bot, 'music_handover', None)
+        bot.music_handover = None
+        if handover is not None:
+            self.adopt(handover)
+        else:
+            persistence_config = bot.config.get('persistence', {})
+            self.store = PlayerStore(
+                persistence_config.get('path', 'players.db'))
+
+        self.startup_task = bot.loop.create_task(
+            self.startup(restore=handover is None))
+        self.monitor_task = bot.loop.create_task(self.monitor_nodes())
+
+    def cog_unload(self):
+        self.startup_task.cancel()
+        self.monitor_task.cancel()
+        if self.persist_task:
+            self.persist_task.cancel()
+        for gauge in self.gauges + self.resolver.gauges:
+            gauge.set_function(None)
+
+        if self.bot.reloading_extension == __package__:
+            # The client, nodes and players stay on the bot.
+            self.bot.music_handover = self.handover()
+        else:
+            for task in self.import_tasks:
+                task.cancel()
+            self.store.close()
+
+    def handover(self) -> dict:
+        """Return the state the next instance of the cog takes over."""
+        return {
+            'store': self.store,
+            'persisted': self.persisted,
+            'unrestored': self.unrestored,
+            'node_down_since': self.node_down_since,
+            'import_tasks': self.import_tasks
+        }
+
+    def adopt(self, handover: dict):
+        """Take over the state and the players of the previous instance."""
+        # The store knows the rows written for the persisted guilds.
+        self.store = handover['store']
+        self.persisted = handover['persisted']
+        self.unrestored = handover['unrestored']
+        self.node_down_since = handover['node_down_since']
+        self.import_tasks = handover['import_tasks']
+
+        # The players were created by the classes of the reloaded modules.
+        classes = {
+            x.__name__: x for x in (Player, TrackQueue, FairQueue, QueueEntry,
+                                    PendingEntry, Track, PlayerStore)
+        }
+        failed = 0 if adopt_class(self.store, classes) else 1
+        for player in self.bot.wavelink.players.values():
+            objects = [player, player.queue, player.current,
+                       player.current_entry, *player.queue]
+            if player.prepared:
+                objects.extend(player.prepared)
+
+            failed += sum(not adopt_class(x, classes) for x in objects)
+
+        if failed:
+            print(f'{failed} objects of the players keep their old classes',
+                  file=sys.stderr)
+
+    def count_players(self) -> dict:
+        counts = {(x,): 0 for x in self.bot.wavelink.nodes}
+        for player in self.bot.wavelink.players.values():
+            if player.is_connected:
+                key = (player.node.identifier,)
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def count_queue_entries(self) -> dict:
+        return {
+            (): sum(len(x.queue) for x in self.bot.wavelink.players.values())
+        }
+
+    def max_queue_length(self) -> dict:
+        return {
+            (): max((len(x.queue) for x in self.bot.wavelink.players.values()),
+                    default=0)
+        }
+
+    async def startup(self, *, restore: bool = True):
+        """Connect to the nodes, restore the saved players and start saving them."""
+        await self.start_nodes()
+        if restore:
+            await self.restore_players()
+
+        self.persist_task = self.bot.loop.create_task(self.persist_players())
 
     async def start_nodes(self):
-        """Connect to the lavalink nodes."""
+        """Connect to the lavalink nodes that are not connected yet, all at once."""
         await self.bot.wait_until_ready()
 
-        lavalink_nodes = self.bot.config.get('lavalink_nodes')
+        # Nodes kept over a reload reconnect on their own.
+        node_configs = [
+            x for x in self.bot.config.get('lavalink_nodes')
+            if not self.bot.wavelink.get_node(x['identifier'])
+        ]
+        if not node_configs:
+            return
+
+        timeout = self.bot.config.get('nodes', {}).get('connect_timeout', 10)
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *[self.start_node(x, timeout=timeout) for x in node_configs])
 
-        for node_config in lavalink_nodes:
-            identifier = node_config['identifier']
-            try:
-                node = self.bot.wavelink.get_node(identifier)
-                if node:
-                    await node.destroy()
+        print(f'Connected to {sum(results)} of {len(results)} nodes in '
+              f'{time.perf_counter() - start:.2f} seconds')
+
+    async def start_node(self, node_config: dict, *, timeout: float) -> bool:
+        """Connect to a lavalink node, return whether it is available."""
+        identifier = node_config['identifier']
+        try:
+            node = await asyncio.wait_for(
+                self.bot.wavelink.initiate_node(**node_config), timeout)
+        except wavelink.errors.NodeOccupied:
+            print(f'Node "{identifier}" already exists')
+            return self.bot.wavelink.get_node(identifier).is_available
+        except asyncio.TimeoutError:
+            print(f'Node "{identifier}" did not connect within {timeout} '
+                  'seconds')
+            return False
 
-                await self.bot.wavelink.initiate_node(**node_config)
-            except wavelink.errors.NodeOccupied:
-                print(f'Node "{identifier}" already exists')
+        if not node.is_available:
+            print(f'Node "{identifier}" is not available')
+            return False
+        return True
 
-    async def stop_nodes(self):
-        if not self.bot.wavelink.nodes:
+    async def stop_nodes(self, *, timeout: float = None):
+        """Destroy the lavalink nodes and their players, all at once."""
+        if timeout is None:
+            timeout = self.bot.config.get('nodes', {}).get('stop_timeout', 5)
+
+        nodes = list(self.bot.wavelink.nodes.values())
+        results = await asyncio.gather(
+            *[asyncio.wait_for(x.destroy(), timeout) for x in nodes],
+            return_exceptions=True)
+
+        for node, result in zip(nodes, results):
+            if isinstance(result, asyncio.TimeoutError):
+                print(f'Node "{node.identifier}" was not destroyed within '
+                      f'{timeout} seconds')
+            elif isinstance(result, Exception):
+                print(f'Node "{node.identifier}" was not destroyed: {result}')
+
+    async def drain(self, timeout: float = None):
+        """Save and destroy the players and the nodes within a timeout.
+
+        The saved players are restored on the next start. Steps that do not
+        finish before the timeout are cancelled.
+        """
+        if timeout is None:
+            timeout = self.bot.config.get('shutdown', {}).get('timeout', 10)
+        deadline = self.bot.loop.time() + timeout
+
+        def remaining() -> float:
+            return max(0, deadline - self.bot.loop.time())
+
+        self.draining = True
+        for task in (self.startup_task, self.monitor_task, self.persist_task,
+                     *self.import_tasks):
+            if task:
+                task.cancel()
+
+        try:
+            await asyncio.wait_for(self.save_players(), remaining())
+        except asyncio.TimeoutError:
+            print('Saving the players timed out')
+
+        players = list(self.bot.wavelink.players.values())
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*[x.destroy() for x in players],
+                               return_exceptions=True), remaining())
+        except asyncio.TimeoutError:
+            print('Destroying the players timed out')
+
+        await self.stop_nodes(timeout=remaining())
+        print(f'Drained {len(players)} players in '
+              f'{timeout - remaining():.2f} seconds')
+
+    async def restore_players(self):
+        """Recreate the players saved before the last shutdown."""
+        states = await self.bot.loop.run_in_executor(self.store.executor,
+                                                     self.store.load)
+        if not states:
+            return
+
+        # Players that can not be restored are deleted on the next save.
+        self.persisted.update(x['guild_id'] for x in states)
+        await self.restore_states(states)
+
+    async def restore_unrestored(self):
+        """Recreate the saved players that had no node available."""
+        # Skip the guilds where a new player replaced the saved one already.
+        states = [
+            x for x in self.unrestored.values()
+            if x['guild_id'] not in self.bot.wavelink.players
+        ]
+        self.unrestored.clear()
+        if not states:
             return
 
-        nodes = self.bot.wavelink.nodes.copy().values()
-        for node in nodes:
-            await node.destroy()
+        self.persisted.update(x['guild_id'] for x in states)
+        await self.restore_states(states)
+
+    async def restore_states(self, states: list):
+        """Recreate saved players, keeping the ones without an available node."""
+        players = []
+        for state in states:
+            guild = self.bot.get_guild(state['guild_id'])
+            channel = guild and guild.get_channel(state['channel_id'])
+            if channel is None:
+                continue
+
+            node = self.select_node(guild)
+            if node is None:
+                # Kept in the store and retried by monitor_nodes.
+                self.unrestored[guild.id] = state
+                self.persisted.discard(guild.id)
+                continue
+
+            players.append(self.restore_player(state, channel, node))
+
+        results = await asyncio.gather(*players, return_exceptions=True)
+        restored = sum(x is True for x in results)
+        print(f'Restored {restored} of {len(states)} players')
+
+    async def restore_player(self, state: dict,
+                             channel: discord.VoiceChannel,
+                             node: wavelink.Node) -> bool:
+        player = self.bot.wavelink.get_player(channel.guild.id,
+                                              cls=Player,
+                                              node_id=node.identifier)
+        player.repeat_one = state['repeat_one']
+        player.set_fair(state['fair'])
+        player.queue.extend(entry_from_dict(x) for x in state['queue'])
+
+        # The queue is stored already, only later changes have to be saved.
+        player.take_state()
+
+        await player.connect(channel.id)
+        if state['volume'] != 100:
+            await player.set_volume(state['volume'])
+
+        if state['current']:
+            entry = QueueEntry.from_dict(state['current'])
+            await player.play_entry(entry, start=state['position'])
+            if state['paused']:
+                await player.set_pause(True)
+            player.prefetch()
+        else:
+            await player.next_track()
+
+        return True
+
+    async def persist_players(self):
+        """Save the state of the connected players periodically."""
+        interval = self.bot.config.get('persistence', {}).get('interval', 1)
+
+        while not self.bot.is_closed():
+            await asyncio.sleep(interval)
+            await self.save_players()
+
+    async def save_players(self):
+        """Write the changes of the connected players to the store."""
+        states = []
+        persisted = set()
+        for guild_id, player in self.bot.wavelink.players.items():
+            if not player.is_connected:
+                continue
+
+            states.append(
+                player.take_state(reset=guild_id not in self.persisted))
+            persisted.add(guild_id)
+
+        removed = list(self.persisted - persisted)
+        self.persisted = persisted
+
+        try:
+            await self.bot.loop.run_in_executor(self.store.executor,
+                                                self.store.save, states,
+                                                removed)
+        except Exception:
+            # The journals are taken already. The players are written in
+            # full on the next save and the removed ones deleted again.
+            self.persisted = set(removed)
+            print('Saving the players failed:', file=sys.stderr)
+            traceback.print_exc()
+
+    async def monitor_nodes(self):
+        """Move the players of disconnected nodes to healthy ones."""
+        await self.bot.wait_until_ready()
+
+        failover_config = self.bot.config.get('failover', {})
+        interval = failover_config.get('interval', 2)
+        grace = failover_config.get('grace', 3)
+        reconnect_interval = self.bot.config.get('nodes', {}).get(
+            'reconnect_interval', 30)
+        reconnect_at = time.time() + reconnect_interval
+
+        while not self.bot.is_closed():
+            await asyncio.sleep(interval)
+
+            now = time.time()
+            if now >= reconnect_at:
+                reconnect_at = now + reconnect_interval
+                await self.reconnect_nodes()
+
+            for identifier, node in self.bot.wavelink.nodes.copy().items():
+                if node.is_available:
+                    self.node_down_since.pop(identifier, None)
+                    continue
+
+                down_since = self.node_down_since.setdefault(identifier, now)
+                if now - down_since >= grace and node.players:
+                    await self.failover(node, down_since)
+
+            if self.unrestored and any(
+                    x.is_available for x in self.bot.wavelink.nodes.values()):
+                await self.restore_unrestored()
+
+    async def reconnect_nodes(self):
+        """Connect to the nodes that were not available on startup."""
+        # wavelink only reconnects the nodes that were connected once.
+        nodes = [
+            x for x in self.bot.wavelink.nodes.values()
+            if not x.is_available and x._websocket._task is None
+        ]
+        timeout = self.bot.config.get('nodes', {}).get('connect_timeout', 10)
+        await asyncio.gather(
+            *[asyncio.wait_for(x.connect(self.bot), timeout) for x in nodes],
+            return_exceptions=True)
+
+        # Nodes that did not connect within the timeout are not registered.
+        await self.start_nodes()
+
+    async def failover(self, node: wavelink.Node, down_since: float):
+        """Move all players of a node to other nodes."""
+        players = list(node.players.values())
+
+        async def move(player: Player):
+            guild = self.bot.get_guild(player.guild_id)
+            target = self.select_node(guild, exclude=(node.identifier,))
+            if target is None:
+                return False
+
+            # The audio stopped when the node went down.
+            position = None
+            if player.last_update and not player.is_paused:
+                position = max(
+                    0, player.position - (time.time() - down_since) * 1000)
+
+            await player.move_to(target, position=position)
+            return True
+
+        results = await asyncio.gather(*[move(x) for x in players],
+                                       return_exceptions=True)
+        moved = sum(x is True for x in results)
+        print(f'Node "{node.identifier}" is down, moved {moved} of '
+              f'{len(players)} players')
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member,
+                               after: discord.Member):
+        if before.roles != after.roles:
+            self.privileges.invalidate_member(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.privileges.invalidate_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild,
+                              after: discord.Guild):
+        if before.owner_id != after.owner_id:
+            self.privileges.invalidate_guild(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role,
+                                   after: discord.Role):
+        self.privileges.invalidate_guild(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.privileges.invalidate_guild(role.guild.id)
 
     @wavelink.WavelinkMixin.listener('on_track_stuck')
     @wavelink.WavelinkMixin.listener('on_track_end')
     @wavelink.WavelinkMixin.listener('on_track_exception')
     async def _on_player_stop(self, node: wavelink.Node, payload):
-        if payload.player.repeat_one:
-            payload.player.queue.appendleft(payload.track)
+        if self.draining:
+            return
 
-        await payload.player.next_track()
+        player = payload.player
+        if player.repeat_one and player.current_entry is not None:
+            player.queue.appendleft(player.current_entry)
+
+        await player.next_track()
+
+    def select_node(self, guild: discord.Guild, *,
+                    exclude=()) -> wavelink.Node:
+        """Return the node a player for a guild should be placed on."""
+        region_penalty = self.bot.config.get('node_selection',
+                                             {}).get('region_penalty', 100)
+        return balancer.select_node(self.bot.wavelink,
+                                    guild,
+                                    region_penalty=region_penalty,
+                                    exclude=exclude)
 
     async def cog_before_invoke(self, ctx: commands.Context):
+        node_id = None
+        if ctx.guild.id not in ctx.bot.wavelink.players:
+            node = self.select_node(ctx.guild)
+            if node is not None:
+                node_id = node.identifier
+
         try:
             player = ctx.bot.wavelink.get_player(ctx.guild.id,
                                                  cls=Player,
+                                                 node_id=node_id,
                                                  context=ctx)
         except wavelink.errors.ZeroConnectedNodes:
             await ctx.send(f':x: An error occured. Try again later.',
                            delete_after=5)
             raise CancelExecution
 
+        if player.context is None:
+            player.context = ctx
+
         if not player.channel_id:
             return
 
@@ -251,28 +764,51 @@ class Music(commands.Cog, wavelink.WavelinkMixin):
         """Play a track from a URL or a search query."""
         player = ctx.bot.wavelink.get_player(ctx.guild.id, cls=Player)
 
-        if not validators.url(query):
-            query = f"ytsearch:{query}"
+        query = search_query(query)
 
-        result = None
-        counter = 0
-        while result is None and counter < 10:
-            result = await ctx.bot.wavelink.get_tracks(query)
-            counter += 1
+        # Searches that will not play soon are resolved by the prefetcher.
+        if player.is_playing and query.startswith('ytsearch:'):
+            entry = PendingEntry(query, ctx.author.id)
+            player.queue.append(entry)
+            player.prefetch()
 
-        if isinstance(result, wavelink.TrackPlaylist):
-            result = result.tracks
-        elif result:
-            result = result[:1]
-        else:
+            embed = discord.Embed(title='Enqueued',
+                                  description=entry.title,
+                                  timestamp=datetime.datetime.utcnow())
+            embed.add_field(name='Position In Queue',
+                            value=len(player.queue),
+                            inline=True)
+            embed.set_footer(text=f'Requested by {ctx.author}',
+                             icon_url=ctx.author.avatar_url)
+
+            await ctx.send(embed=embed, delete_after=5)
+            return
+
+        try:
+            result = await self.resolver.resolve(query)
+        except TrackLoadError as e:
+            await ctx.send(f':x: {e} Try again later.', delete_after=5)
+            return
+
+        result = result_tracks(result)
+        if not result:
             await ctx.send(f':x: No results.', delete_after=5)
             return
 
-        tracks = [Track(x.id, x.info, requester=ctx.author) for x in result]
+        # Large playlists are enqueued in the background after the first
+        # chunk, so playback starts without waiting for the whole playlist.
+        chunk_size = self.bot.config.get('playlist_import',
+                                         {}).get('chunk_size', 100)
+        remaining = result[chunk_size:]
+
+        entries = [
+            QueueEntry.from_track(x, ctx.author.id)
+            for x in result[:chunk_size]
+        ]
 
-        player.queue.extend(tracks)
+        player.queue.extend(entries)
 
-        track_count = len(tracks)
+        track_count = len(entries)
 
         if not player.is_connected:
             if not ctx.author.voice:
@@ -286,10 +822,15 @@ class Music(commands.Cog, wavelink.WavelinkMixin):
             await player.next_track()
             track_count -= 1
 
-        if track_count > 1:
+        if remaining:
+            task = self.bot.loop.create_task(
+                self.import_playlist(ctx, player, remaining, track_count))
+            self.import_tasks.add(task)
+            task.add_done_callback(self.import_tasks.discard)
+        elif track_count > 1:
             await ctx.send(f'Enqueued {track_count} tracks.', delete_after=5)
         elif track_count > 0:
-            track = tracks[0]
+            track = Track(result[0].id, result[0].info, requester=ctx.author)
 
             duration = converters.format_timedelta(milliseconds=track.duration)
 
@@ -308,6 +849,110 @@ class Music(commands.Cog, wavelink.WavelinkMixin):
         else:
             await ctx.message.delete()
 
+    async def import_playlist(self, ctx: commands.Context, player: Player,
+                              tracks: list, enqueued: int):
+        """Add the remaining tracks of a playlist to the queue in chunks.
+
+        The event loop gets control back after every chunk and the progress
+        is shown in a single message that is edited at most every few seconds.
+        """
+        import_config = self.bot.config.get('playlist_import', {})
+        chunk_size = import_config.get('chunk_size', 100)
+        progress_interval = import_config.get('progress_interval', 2)
+
+        total = enqueued + len(tracks)
+        message = await ctx.send(
+            f':hourglass: Enqueuing {total} tracks... {enqueued}/{total}')
+        edited_at = time.monotonic()
+
+        try:
+            for i in range(0, len(tracks), chunk_size):
+                # Stop when the player was stopped or replaced meanwhile.
+                if ctx.bot.wavelink.players.get(ctx.guild.id) is not player:
+                    await message.edit(
+                        content=
+                        f':x: Stopped enqueuing after {enqueued} of {total} tracks.'
+                    )
+                    return
+
+                player.queue.extend(
+                    QueueEntry.from_track(x, ctx.author.id)
+                    for x in tracks[i:i + chunk_size])
+                enqueued += min(chunk_size, len(tracks) - i)
+
+                if time.monotonic() - edited_at >= progress_interval:
+                    await message.edit(
+                        content=
+                        f':hourglass: Enqueuing {total} tracks... {enqueued}/{total}'
+                    )
+                    edited_at = time.monotonic()
+
+                await asyncio.sleep(0)
+
+            await message.edit(content=f'Enqueued {enqueued} tracks.')
+        except discord.HTTPException:
+            pass
+        finally:
+            # Like ctx.send with delete_after, the command message goes too.
+            ctx.bot.expiry.schedule(message, 5)
+            ctx.bot.expiry.schedule(ctx.message, 5)
+
+    @commands.command(aliases=['bulk', 'playall'])
+    @commands.guild_only()
+    async def playmany(self, ctx: commands.Context, *, queries: str):
+        """Play several tracks at once, one URL or search query per line."""
+        player = ctx.bot.wavelink.get_player(ctx.guild.id, cls=Player)
+
+        queries = [x.strip() for x in queries.splitlines() if x.strip()]
+        if len(queries) > self.BULK_LIMIT:
+            await ctx.send(
+                f':x: You can enqueue at most {self.BULK_LIMIT} queries at once.',
+                delete_after=5)
+            return
+
+        # The resolver limits the concurrent requests per node.
+        results = await asyncio.gather(
+            *[self.resolver.resolve(search_query(x)) for x in queries],
+            return_exceptions=True)
+
+        entries = []
+        failed = []
+        for query, result in zip(queries, results):
+            if isinstance(result, Exception):
+                if not isinstance(result, TrackLoadError):
+                    raise result
+                result = None
+
+            tracks = result_tracks(result)
+            if not tracks:
+                failed.append(query)
+            entries.extend(
+                QueueEntry.from_track(x, ctx.author.id) for x in tracks)
+
+        if not entries:
+            await ctx.send(':x: No results.', delete_after=5)
+            return
+
+        player.queue.extend(entries)
+
+        if not player.is_connected:
+            if not ctx.author.voice:
+                await ctx.send(':x: Neither you nor I are in a voice channel.',
+                               delete_after=5)
+                return
+
+            await player.connect(ctx.author.voice.channel.id)
+
+        if not player.is_playing:
+            await player.next_track()
+
+        text = (f'Enqueued {len(entries)} tracks from '
+                f'{len(queries) - len(failed)} of {len(queries)} queries.')
+        if failed:
+            text += '\nNo results for: ' + ', '.join(f'`{x}`'
+                                                     for x in failed)
+        await ctx.send(text[:2000], delete_after=10)
+
     @commands.command()
     @commands.guild_only()
     @commands.check(is_privileged)
@@ -463,8 +1108,7 @@ class Music(commands.Cog, wavelink.WavelinkMixin):
             await ctx.send('The queue is empty.', delete_after=5)
             return
 
-        source = QueuePageSource(list(player.queue))
-        pages = menus.MenuPages(source, delete_message_after=True)
+        pages = QueueMenu(QueuePageSource(player), delete_message_after=True)
         await pages.start(ctx, wait=True)
         await ctx.message.delete()
 
@@ -478,9 +1122,81 @@ class Music(commands.Cog, wavelink.WavelinkMixin):
             await ctx.send(':x: The queue is empty.', delete_after=5)
             return
 
-        random.shuffle(player.queue)
+        player.queue.shuffle()
+        player.prefetch()
         await ctx.send(':game_die: Shuffled queue.', delete_after=5)
 
+    @commands.command(aliases=['rm'])
+    @commands.guild_only()
+    @commands.check(is_privileged)
+    async def remove(self, ctx: commands.Context,
+                     target: typing.Union[int, discord.Member]):
+        """Remove a queue entry by its position or all entries of a user."""
+        player = ctx.bot.wavelink.get_player(ctx.guild.id, cls=Player)
+
+        if isinstance(target, discord.Member):
+            count = player.queue.remove_requester(target.id)
+            if count < 1:
+                await ctx.send(
+                    f':x: There are no entries requested by **{target.display_name}**.',
+                    delete_after=5)
+                return
+
+            await ctx.send(
+                f':wastebasket: Removed {count} entries requested by **{target.display_name}**.',
+                delete_after=5)
+            return
+
+        # The queue counts negative positions from the end.
+        try:
+            if target < 1:
+                raise IndexError
+            track = player.queue.pop(target - 1)
+        except IndexError:
+            await ctx.send(f':x: There is no entry at position {target}.',
+                           delete_after=5)
+            return
+
+        await ctx.send(f':wastebasket: Removed **{track.title}**.',
+                       delete_after=5)
+
+    @commands.command()
+    @commands.guild_only()
+    @commands.check(is_privileged)
+    async def move(self, ctx: commands.Context, position: int, target: int):
+        """Move a queue entry to another position."""
+        player = ctx.bot.wavelink.get_player(ctx.guild.id, cls=Player)
+
+        target = max(1, min(target, len(player.queue)))
+        try:
+            if position < 1:
+                raise IndexError
+            track = player.queue.move(position - 1, target - 1)
+        except IndexError:
+            await ctx.send(f':x: There is no entry at position {position}.',
+                           delete_after=5)
+            return
+
+        player.prefetch()
+
+        await ctx.send(
+            f':arrow_right_hook: Moved **{track.title}** to position {target}.',
+            delete_after=5)
+
+    @commands.command(aliases=['dedup'])
+    @commands.guild_only()
+    @commands.check(is_privileged)
+    async def dedupe(self, ctx: commands.Context):
+        """Remove duplicate tracks from the queue."""
+        player = ctx.bot.wavelink.get_player(ctx.guild.id, cls=Player)
+
+        count = player.queue.dedupe()
+        if count < 1:
+            await ctx.send(':x: The queue has no duplicates.', delete_after=5)
+            return
+
+        await ctx.send(f':broom: Removed {count} duplicates.', delete_after=5)
+
     @commands.command(aliases=['loop'])
     @commands.guild_only()
     @commands.check(is_privileged)
@@ -503,6 +1219,30 @@ class Music(commands.Cog, wavelink.WavelinkMixin):
 
         await player.update_now_playing_message()
 
+    @commands.command(aliases=['fairqueue'])
+    @commands.guild_only()
+    @commands.check(is_privileged)
+    async def fair(self, ctx: commands.Context,
+                   enable: typing.Optional[bool]):
+        """Toggle whether the queue should take turns between the requesters."""
+        player = ctx.bot.wavelink.get_player(ctx.guild.id, cls=Player)
+
+        if enable is None:
+            enable = not player.is_fair
+
+        text = 'enabled' if enable else 'disabled'
+
+        if player.is_fair == enable:
+            await ctx.send(f':x: Fair queue is already {text}.',
+                           delete_after=5)
+            return
+
+        player.set_fair(enable)
+        await ctx.send(f':busts_in_silhouette: Fair queue {text}.',
+                       delete_after=5)
+
+        await player.update_now_playing_message()
+
 
 def setup(bot: commands.Bot):
     bot.add_cog(Music(bot))
@@ -1,16 +1,21 @@
 import asyncio
 import async_timeout
-from collections import deque
 from . import converters
 import copy
 import datetime
 import discord
+import json
 from discord.ext import commands, menus
+from .queue import FairQueue, TrackQueue
+from .reactions import RoutedMenu
+from .track import PendingEntry, QueueEntry, Track
 import re
+import sys
+import time
 import wavelink
 
 
-class PlayerControl(menus.Menu):
+class PlayerControl(RoutedMenu):
 
     def __init__(self, player, *args, **kwargs):
         super().__init__(*args, **kwargs, timeout=None)
@@ -20,6 +25,7 @@ class PlayerControl(menus.Menu):
     def get_context(self, payload: discord.RawReactionActionEvent):
         ctx = copy.copy(self.ctx)
         ctx.author = payload.member
+        ctx.started_at = time.perf_counter()
         return ctx
 
     def reaction_check(self, payload: discord.RawReactionActionEvent):
@@ -70,45 +76,257 @@ class PlayerControl(menus.Menu):
 
 class Player(wavelink.Player):
 
+    # Seconds to wait for further state changes before updating the message.
+    UPDATE_DELAY = 0.5
+    # Seconds to wait after an edit before editing the message again.
+    UPDATE_INTERVAL = 1.5
+    # Seconds before the end of a track to prepare the next one again.
+    PREPARE_AHEAD = 10
+
+    # Set while next_track picks and starts the next entry.
+    advancing = False
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.context: commands.Context = kwargs.get('context', None)
 
-        self.updating = False
+        self.update_task: asyncio.Task = None
+        self.update_pending = False
+
+        self.prefetch_task: asyncio.Task = None
+        self.prepare_task: asyncio.Task = None
+        # The first queue entry, its resolved entry and its track.
+        self.prepared: tuple = None
+        # When the last track ended, to measure the gap to the next one.
+        self.track_ended_at: float = None
 
-        self.queue = deque()
+        # Starts reset, the store could hold the queue of an earlier player.
+        self.journal = [('reset',)]
+        self.queue = TrackQueue()
+        self.queue.journal = self.journal
         self.repeat_one = False
+        # The queue entry of the current track.
+        self.current_entry: QueueEntry = None
 
         self.now_playing_message: discord.Message = None
+        self.now_playing_embed: dict = None
         self.control_menu: PlayerControl = None
 
+    @property
+    def is_fair(self) -> bool:
+        """Return whether the queue takes turns between the requesters."""
+        return isinstance(self.queue, FairQueue)
+
+    def set_fair(self, enable: bool):
+        """Switch between a first in first out queue and a fair queue."""
+        if enable == self.is_fair:
+            return
+
+        cls = FairQueue if enable else TrackQueue
+        self.queue = cls(self.queue)
+        self.queue.journal = self.journal
+        self.journal[:] = [('reset',)]
+
+    def take_state(self, *, reset: bool = False) -> dict:
+        """Return the state to persist and start a new queue journal.
+
+        The state contains the player row, the queue changes since the last
+        call and, if the journal was reset, all queue entries.
+        """
+        journal = self.journal
+        if reset:
+            journal = [('reset',)]
+
+        self.journal = []
+        self.queue.journal = self.journal
+
+        current = None
+        if self.current is not None and self.current_entry is not None:
+            current = json.dumps(self.current_entry.to_dict())
+
+        lanes = None
+        if self.is_fair:
+            lanes = json.dumps(self.queue.requesters)
+
+        state = {
+            'row': (self.guild_id, self.channel_id, self.volume,
+                    int(self.paused), int(self.repeat_one), int(self.is_fair),
+                    current, int(self.position), lanes),
+            'journal': journal
+        }
+        if journal and journal[0][0] == 'reset':
+            state['entries'] = list(self.queue)
+
+        return state
+
     async def next_track(self):
         """Play the next track in the queue."""
-        if self.is_playing:
+        # A call made while another one resolves the popped entry would
+        # start a second track.
+        if self.is_playing or self.advancing:
             return
 
-        if len(self.queue) < 1:
+        self.advancing = True
+        try:
+            while self.queue:
+                entry = self.queue.popleft()
+                prepared, self.prepared = self.prepared, None
+
+                # The next track is usually prepared while the current one
+                # plays.
+                if prepared is not None and prepared[0] is entry:
+                    _, entry, track = prepared
+                    await self.play_entry(entry, track=track)
+                else:
+                    if hasattr(entry, 'resolve'):
+                        entry = await entry.resolve(self.resolver)
+                        if entry is None:
+                            continue
+                    await self.play_entry(entry)
+
+                # Everything else happens after the track started.
+                self.prefetch()
+                await self.update_now_playing_message()
+                return
+
             await self.destroy()
+        finally:
+            self.advancing = False
+
+    async def hook(self, event):
+        if isinstance(event, wavelink.TrackEnd) and not self._new_track:
+            self.track_ended_at = time.perf_counter()
+        elif isinstance(event, wavelink.TrackStart):
+            if self.track_ended_at is not None:
+                self.bot.metrics.histogram(
+                    'lavabot_track_transition_seconds',
+                    'Time from the end of a track to the start of the next one.',
+                    ('node',)).observe(
+                        time.perf_counter() - self.track_ended_at,
+                        self.node.identifier)
+                self.track_ended_at = None
+
+            self._schedule_prepare()
+
+        await super().hook(event)
+
+    def _schedule_prepare(self):
+        """Prefetch and prepare the next track again shortly before the current one ends.
+
+        The queue could have changed since the track started.
+        """
+        if self.prepare_task:
+            self.prepare_task.cancel()
+            self.prepare_task = None
+
+        track = self.current
+        if track is None or track.is_stream or not track.length:
             return
 
-        track = self.queue.popleft()
-        await self.play(track)
+        delay = (track.length - self.position) / 1000 - self.PREPARE_AHEAD
+        self.prepare_task = self.bot.loop.create_task(
+            self._prepare_later(max(0, delay)))
 
-        await self.update_now_playing_message()
+    async def _prepare_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self.prefetch()
 
-    async def update_now_playing_message(self):
-        """Update the information in the 'now playing' message or send new a one."""
-        if self.updating:
+    def prepare_next(self):
+        """Build the track of the first queue entry if it is resolved."""
+        if not self.queue:
+            self.prepared = None
             return
 
-        track = self.current
-        if track is None:
+        head = self.queue[0]
+        if self.prepared is not None and self.prepared[0] is head:
             return
 
-        self.updating = True
+        entry = head
+        if hasattr(head, 'resolve'):
+            entry = head.entry
+            if entry is None:
+                self.prepared = None
+                return
+
+        guild = self.bot.get_guild(self.guild_id)
+        self.prepared = (head, entry, entry.to_track(guild))
+
+    @property
+    def resolver(self):
+        return self.bot.get_cog('Music').resolver
+
+    def prefetch(self):
+        """Resolve the pending searches at the front of the queue in the background."""
+        if self.prefetch_task is None or self.prefetch_task.done():
+            self.prefetch_task = self.bot.loop.create_task(self._prefetch())
+
+    async def _prefetch(self):
+        ahead = self.bot.config.get('prefetch', {}).get('ahead', 3)
+
+        # The front of the queue could change while resolving.
+        while True:
+            pending = [
+                x for x in self.queue[:ahead]
+                if not getattr(x, 'is_resolved', True)
+            ]
+            if not pending:
+                break
+
+            await asyncio.gather(*[self._resolve(x) for x in pending])
+            # Resolved entries show their title, open queue views redraw.
+            self.queue.version += 1
+
+        self.prepare_next()
+
+    async def _resolve(self, entry: PendingEntry):
+        query = entry.id
+        await entry.resolve(self.resolver)
+        # Duplicates of the track are found once it is counted by its ID.
+        self.queue.rekey(entry, query)
+
+    async def play_entry(self,
+                         entry: QueueEntry,
+                         *,
+                         track: Track = None,
+                         start: int = 0):
+        """Play a queue entry, building its full track unless it is given."""
+        if track is None:
+            track = entry.to_track(self.bot.get_guild(self.guild_id))
+
+        self.current_entry = entry
+        await self.play(track, start=start)
+
+    async def update_now_playing_message(self):
+        """Schedule an update of the 'now playing' message or the sending of a new one.
+
+        Updates requested in quick succession are merged into one edit, which
+        always shows the latest state of the player.
+        """
+        self.update_pending = True
+        if self.update_task is None or self.update_task.done():
+            self.update_task = self.bot.loop.create_task(
+                self._now_playing_loop())
+
+    async def _now_playing_loop(self):
+        while self.update_pending:
+            await asyncio.sleep(self.UPDATE_DELAY)
+            self.update_pending = False
+
+            try:
+                edited = await self._update_now_playing_message()
+            except discord.HTTPException as e:
+                print(f'Failed to update the now playing message: {e}',
+                      file=sys.stderr)
+                edited = True
+
+            # Stay below the rate limit of message edits in the channel.
+            if edited:
+                await asyncio.sleep(self.UPDATE_INTERVAL)
+
+    def _now_playing_embed(self) -> discord.Embed:
+        track = self.current
 
-        print(track.duration)
         duration = converters.format_timedelta(milliseconds=track.duration)
         embed = discord.Embed(title='Now Playing',
                               description=f'[{track.title}]({track.uri})',
@@ -126,27 +344,71 @@ class Player(wavelink.Player):
         if self.repeat_one:
             embed.add_field(name='Repeat', value='Enabled', inline=True)
 
+        if self.is_fair:
+            embed.add_field(name='Fair Queue', value='Enabled', inline=True)
+
+        return embed
+
+    async def _update_now_playing_message(self) -> bool:
+        """Send or edit the 'now playing' message and return whether a request was made."""
+        # Restored players have no channel until the next command.
+        if self.current is None or self.context is None:
+            return False
+
+        embed = self._now_playing_embed()
+        rendered = embed.to_dict()
+
         if not self.now_playing_message:
             self.now_playing_message = await self.context.send(embed=embed)
+            self.now_playing_embed = rendered
 
             self.control_menu = PlayerControl(player=self,
                                               message=self.now_playing_message)
             await self.control_menu.start(self.context)
-        else:
-            await self.now_playing_message.edit(embed=embed)
+            return True
 
-        self.updating = False
+        if rendered == self.now_playing_embed:
+            return False
+
+        await self.now_playing_message.edit(embed=embed)
+        self.now_playing_embed = rendered
+        return True
 
-    async def destroy(self):
+    async def move_to(self, node: wavelink.Node, *, position: int = None):
+        """Move the player to another node and resume the current track.
+
+        The queue, volume, pause state and repeat setting are kept since they
+        live on the player itself.
+        """
+        if position is not None and self.current:
+            self.last_position = position
+            self.last_update = time.time() * 1000
+
+        await self.change_node(node.identifier)
+
+    async def destroy(self, *, force: bool = False):
         """Delete the 'now playing' message and destroy the player."""
+        if self.update_task:
+            self.update_task.cancel()
+            self.update_task = None
+        self.update_pending = False
+
+        for task in (self.prefetch_task, self.prepare_task):
+            if task:
+                task.cancel()
+        self.prefetch_task = None
+        self.prepare_task = None
+        self.prepared = None
+
         if self.now_playing_message:
             self.control_menu.stop()
             self.control_menu = None
 
             await self.now_playing_message.delete()
             self.now_playing_message = None
+            self.now_playing_embed = None
 
         try:
-            await super().destroy()
+            await super().destroy(force=force)
         except KeyError:
             pass
@@ -0,0 +1,48 @@
+from .cache import TTLCache
+import discord
+from discord.ext import commands
+
+
+class PrivilegeCache:
+    """Cache whether members are the bot owner, the guild owner or a DJ."""
+
+    def __init__(self, bot: commands.Bot, *, size: int = 4096, ttl: float = 60):
+        self.bot = bot
+        self.decisions = TTLCache(size, ttl)
+
+    async def is_privileged(self, member: discord.Member) -> bool:
+        """Return whether a member may use privileged commands."""
+        key = (member.guild.id, member.id)
+
+        decision = self.decisions.get(key)
+        if decision is None:
+            decision = await self._resolve(member)
+            self.decisions.set(key, decision)
+
+        return decision
+
+    async def _resolve(self, member: discord.Member) -> bool:
+        guild = member.guild
+
+        if guild.owner_id == member.id:
+            return True
+
+        # discord.py fetches the application info once and keeps the owner.
+        if await self.bot.is_owner(member):
+            return True
+
+        role_id = self.bot.config.get('dj_roles', {}).get(str(guild.id))
+        if role_id is None:
+            return False
+
+        # The member's role ids are a sorted array, this is a binary search.
+        return member._roles.has(role_id)
+
+    def invalidate_member(self, guild_id: int, member_id: int):
+        """Forget the decision for a member."""
+        self.decisions.pop((guild_id, member_id))
+
+    def invalidate_guild(self, guild_id: int):
+        """Forget the decisions for all members of a guild."""
+        for key in [k for k in self.decisions.keys() if k[0] == guild_id]:
+            self.decisions.pop(key)
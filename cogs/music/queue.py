@@ -0,0 +1,607 @@
+from collections import Counter, OrderedDict, defaultdict
+import itertools
+import random
+
+_MISSING = object()
+# Placeholder of an entry removed from the middle of a TrackQueue.
+_REMOVED = object()
+
+
+class TrackQueue:
+    """Queue of tracks with positional access and requester bookkeeping.
+
+    The entries are kept in a list with a moving head, so appending and
+    adding or popping at the front are amortized O(1). Entries removed from
+    the middle are replaced with tombstones that are skipped, and a Fenwick
+    tree over the tombstones finds a position in O(log n). The slots of
+    every requester and the number of entries per track are kept to answer
+    requester and duplicate lookups without scanning the queue. Inserting
+    into the middle shifts the list and is O(n).
+
+    If a journal list is set, changes at the ends of the queue are recorded
+    in it as ('append', entry), ('appendleft', entry) and ('popleft',).
+    Any other change replaces the journal with [('reset',)]. The version is
+    increased on every change.
+    """
+
+    # Drop the consumed front of the list or the tombstones once there are
+    # this many of them.
+    COMPACT_THRESHOLD = 64
+    # Minimum free slots added at the front when appendleft runs out.
+    FRONT_ROOM = 8
+
+    def __init__(self, entries=()):
+        self._entries = []
+        self._head = 0
+        self._length = 0
+        # Slots are list indices plus the offset, so they stay the same
+        # when the front of the list is dropped or extended.
+        self._offset = 0
+
+        self._tombstones = 0
+        self._tree: list = None
+
+        self._slots = {}
+        self._identifiers = Counter()
+
+        self.journal: list = None
+        self.version = 0
+
+        self.extend(entries)
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __iter__(self):
+        entries = itertools.islice(self._entries, self._head, None)
+        if not self._tombstones:
+            return entries
+        return (x for x in entries if x is not _REMOVED)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(self._length))
+            if not positions or positions.step != 1:
+                return [self._entries[self._find(i)] for i in positions]
+
+            entries = itertools.islice(self._entries, self._find(positions[0]),
+                                       None)
+            if self._tombstones:
+                entries = (x for x in entries if x is not _REMOVED)
+            return list(itertools.islice(entries, len(positions)))
+
+        return self._entries[self._find(self._index(index))]
+
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('queue index out of range')
+        return index
+
+    def _find(self, index: int) -> int:
+        """Return the list index of a position."""
+        if not self._tombstones:
+            return self._head + index
+
+        # Find the list prefix with index + 1 entries after the head, all
+        # slots before the head count as entries.
+        tree = self._tree
+        remaining = self._head + index + 1
+        found = 0
+        step = len(tree) - 1
+        while step:
+            node = found + step
+            entries = step - tree[node]
+            if entries < remaining:
+                found = node
+                remaining -= entries
+            step //= 2
+        return found
+
+    def _build_tree(self):
+        size = 16
+        while size < len(self._entries):
+            size *= 2
+
+        tree = [0] * (size + 1)
+        for i, entry in enumerate(self._entries, start=1):
+            if entry is _REMOVED:
+                tree[i] = 1
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _mark(self, index: int, delta: int):
+        tree = self._tree
+        index += 1
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def _added(self, entry, index: int):
+        slots = self._slots.get(entry.requester_id)
+        if slots is None:
+            slots = self._slots[entry.requester_id] = set()
+        slots.add(index + self._offset)
+        self._identifiers[entry.id] += 1
+        self._length += 1
+
+    def _removed(self, entry, index: int):
+        slots = self._slots[entry.requester_id]
+        slots.discard(index + self._offset)
+        if not slots:
+            del self._slots[entry.requester_id]
+
+        self._identifiers[entry.id] -= 1
+        if self._identifiers[entry.id] <= 0:
+            del self._identifiers[entry.id]
+        self._length -= 1
+
+    def _remove(self, index: int):
+        """Replace the entry at a list index with a tombstone."""
+        entry = self._entries[index]
+        self._removed(entry, index)
+        self._entries[index] = _REMOVED
+
+        if self._tree is None:
+            self._build_tree()
+        else:
+            self._mark(index, 1)
+        self._tombstones += 1
+        return entry
+
+    def _record(self, *operation):
+        self.version += 1
+
+        journal = self.journal
+        if journal is None or (journal and journal[0][0] == 'reset'):
+            return
+
+        if operation[0] == 'reset':
+            journal[:] = [operation]
+        else:
+            journal.append(operation)
+
+    def _compact(self):
+        del self._entries[:self._head]
+        self._offset += self._head
+        self._head = 0
+        if self._tombstones:
+            self._build_tree()
+
+    def _pack(self):
+        """Drop the tombstones and the consumed front, O(n).
+
+        The slots have to be indexed again afterwards.
+        """
+        if self._tombstones:
+            self._entries = list(self)
+            self._tombstones = 0
+            self._tree = None
+        else:
+            del self._entries[:self._head]
+        self._head = 0
+        self._offset = 0
+
+    def _index_slots(self):
+        slots = defaultdict(set)
+        for i, entry in enumerate(self._entries):
+            slots[entry.requester_id].add(i)
+        self._slots = dict(slots)
+
+    def _pack_tombstones(self):
+        if (self._tombstones >= self.COMPACT_THRESHOLD and
+                self._tombstones >= self._length):
+            self._pack()
+            self._index_slots()
+
+    def append(self, entry):
+        """Add an entry to the end of the queue."""
+        self._entries.append(entry)
+        self._added(entry, len(self._entries) - 1)
+        if self._tree is not None and len(self._entries) >= len(self._tree):
+            self._build_tree()
+        self._record('append', entry)
+
+    def extend(self, entries):
+        """Add entries to the end of the queue."""
+        for entry in entries:
+            self.append(entry)
+
+    def appendleft(self, entry):
+        """Add an entry to the front of the queue."""
+        if self._head == 0:
+            # Make room at the front for this and later entries. Half the
+            # length is less than popleft compacts, so it is kept.
+            room = max(self.FRONT_ROOM, self._length // 2)
+            self._entries[:0] = [None] * room
+            self._head = room
+            self._offset -= room
+            if self._tombstones:
+                self._build_tree()
+
+        self._head -= 1
+        self._entries[self._head] = entry
+        self._added(entry, self._head)
+        self._record('appendleft', entry)
+
+    def popleft(self):
+        """Remove and return the first entry."""
+        if not self:
+            raise IndexError('pop from an empty queue')
+
+        entries = self._entries
+        while entries[self._head] is _REMOVED:
+            entries[self._head] = None
+            self._mark(self._head, -1)
+            self._head += 1
+            self._tombstones -= 1
+            if not self._tombstones:
+                self._tree = None
+
+        entry = entries[self._head]
+        self._removed(entry, self._head)
+        entries[self._head] = None
+        self._head += 1
+
+        if (self._head >= self.COMPACT_THRESHOLD and
+                self._head * 2 >= len(entries)):
+            self._compact()
+
+        self._record('popleft')
+        return entry
+
+    def pop(self, index: int = 0):
+        """Remove and return the entry at a position."""
+        index = self._index(index)
+        if index == 0:
+            return self.popleft()
+
+        entry = self._remove(self._find(index))
+        self._pack_tombstones()
+        self._record('reset')
+        return entry
+
+    def insert(self, index: int, entry):
+        """Insert an entry before a position."""
+        index = max(0, min(index if index >= 0 else index + self._length,
+                           self._length))
+        if index == 0:
+            self.appendleft(entry)
+            return
+
+        if index == self._length:
+            self.append(entry)
+            return
+
+        self._entries.insert(self._find(index), entry)
+        self._identifiers[entry.id] += 1
+        self._length += 1
+        self._pack()
+        self._index_slots()
+        self._record('reset')
+
+    def move(self, index: int, target: int):
+        """Move the entry at a position to another position."""
+        entry = self.pop(index)
+        self.insert(target, entry)
+        return entry
+
+    def count_requester(self, requester_id: int) -> int:
+        """Return the number of entries requested by a user."""
+        return len(self._slots.get(requester_id, ()))
+
+    def remove_requester(self, requester_id: int) -> int:
+        """Remove all entries requested by a user and return their count."""
+        slots = self._slots.get(requester_id)
+        if not slots:
+            return 0
+
+        count = len(slots)
+        for slot in list(slots):
+            self._remove(slot - self._offset)
+
+        self._pack_tombstones()
+        self._record('reset')
+        return count
+
+    def is_duplicate(self, entry) -> bool:
+        """Return whether the track of an entry is already queued."""
+        return entry.id in self._identifiers
+
+    def rekey(self, entry, old_id):
+        """Count a queued entry by its ID after it changed from another one.
+
+        A pending entry is counted by its query until it is resolved. If no
+        entry is counted by the old ID, the entry was removed already.
+        """
+        if entry.id == old_id or old_id not in self._identifiers:
+            return
+
+        self._identifiers[old_id] -= 1
+        if self._identifiers[old_id] <= 0:
+            del self._identifiers[old_id]
+        self._identifiers[entry.id] += 1
+
+    def dedupe(self) -> int:
+        """Remove all but the first entry of each track and return the removed count."""
+        removed = self._length - len(self._identifiers)
+        if removed == 0:
+            return 0
+
+        seen = set()
+        entries = []
+        for entry in self:
+            if entry.id in seen:
+                continue
+            seen.add(entry.id)
+            entries.append(entry)
+
+        self.clear()
+        self.extend(entries)
+        return removed
+
+    def shuffle(self):
+        """Shuffle the queue in place."""
+        self._pack()
+        random.shuffle(self._entries)
+        self._index_slots()
+        self._record('reset')
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
+        self._head = 0
+        self._length = 0
+        self._offset = 0
+        self._tombstones = 0
+        self._tree = None
+        self._slots.clear()
+        self._identifiers.clear()
+        self._record('reset')
+
+
+class FairQueue:
+    """Queue that takes turns between the requesters.
+
+    Every requester has its own lane and the lanes are served round-robin,
+    so a long playlist of one user does not delay everybody else. Popping
+    the next entry is O(1), the turn of a position is found from the sorted
+    lengths of the lanes in O(lanes log lanes).
+
+    The journal and version work like the ones of TrackQueue, but the
+    journal records the changes of the lanes. The entries are appended or
+    added to the front of the lane of their requester and popping the front
+    of a lane is recorded as ('popleft', requester_id). The order of the
+    lanes is not recorded, it is returned by requesters.
+    """
+
+    def __init__(self, entries=()):
+        self._lanes = OrderedDict()
+        self._length = 0
+
+        self.journal: list = None
+        self.version = 0
+
+        self.extend(entries)
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __iter__(self):
+        lanes = [iter(lane) for lane in self._lanes.values()]
+        while lanes:
+            active = []
+            for lane in lanes:
+                entry = next(lane, _MISSING)
+                if entry is not _MISSING:
+                    active.append(lane)
+                    yield entry
+            lanes = active
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step < 0:
+                return list(self)[index]
+            if start >= stop:
+                return []
+            return list(
+                itertools.islice(self._iter_from(start), 0, stop - start,
+                                 step))
+
+        requester_id, position = self._locate(index)
+        return self._lanes[requester_id][position]
+
+    def _turn(self, index: int):
+        """Return the turn of a queue position and its place in the turn."""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('queue index out of range')
+
+        # Every turn up to the length of the shortest remaining lane has
+        # an entry of each remaining lane.
+        turn = 0
+        active = len(self._lanes)
+        for length in sorted(len(x) for x in self._lanes.values()):
+            entries = (length - turn) * active
+            if index < entries:
+                return turn + index // active, index % active
+            index -= entries
+            turn = length
+            active -= 1
+
+    def _locate(self, index: int):
+        """Return the requester and lane position of a queue position."""
+        turn, place = self._turn(index)
+        active = (k for k, v in self._lanes.items() if len(v) > turn)
+        return next(itertools.islice(active, place, None)), turn
+
+    def _iter_from(self, index: int):
+        """Iterate over the entries from a queue position."""
+        turn, place = self._turn(index)
+        lanes = [x for x in self._lanes.values() if len(x) > turn]
+        while lanes:
+            for lane in itertools.islice(lanes, place, None):
+                yield lane[turn]
+            place = 0
+            turn += 1
+            lanes = [x for x in lanes if len(x) > turn]
+
+    @property
+    def requesters(self) -> list:
+        """Return the IDs of the requesters in the order of their turns."""
+        return list(self._lanes)
+
+    _record = TrackQueue._record
+
+    def _lane(self, requester_id: int) -> TrackQueue:
+        lane = self._lanes.get(requester_id)
+        if lane is None:
+            lane = self._lanes[requester_id] = TrackQueue()
+        return lane
+
+    def append(self, entry):
+        """Add an entry to the end of its requester's lane."""
+        self._lane(entry.requester_id).append(entry)
+        self._length += 1
+        self._record('append', entry)
+
+    def extend(self, entries):
+        """Add entries to the end of their requesters' lanes."""
+        for entry in entries:
+            self.append(entry)
+
+    def appendleft(self, entry):
+        """Add an entry to the front of the queue."""
+        self._lane(entry.requester_id).appendleft(entry)
+        self._lanes.move_to_end(entry.requester_id, last=False)
+        self._length += 1
+        self._record('appendleft', entry)
+
+    def popleft(self):
+        """Remove and return the entry of the requester whose turn it is."""
+        if not self:
+            raise IndexError('pop from an empty queue')
+
+        requester_id, lane = next(iter(self._lanes.items()))
+        entry = lane.popleft()
+        if lane:
+            self._lanes.move_to_end(requester_id)
+        else:
+            del self._lanes[requester_id]
+
+        self._length -= 1
+        self._record('popleft', requester_id)
+        return entry
+
+    def pop(self, index: int = 0):
+        """Remove and return the entry at a position."""
+        requester_id, position = self._locate(index)
+        if requester_id == next(iter(self._lanes)) and position == 0:
+            return self.popleft()
+
+        lane = self._lanes[requester_id]
+        entry = lane.pop(position)
+        if not lane:
+            del self._lanes[requester_id]
+
+        self._length -= 1
+        if position == 0:
+            self._record('popleft', requester_id)
+        else:
+            self._record('reset')
+        return entry
+
+    def insert(self, index: int, entry):
+        """Insert an entry into its requester's lane at the turn of a position.
+
+        Entries keep taking turns, so they can only be placed within the
+        turns of their own requester.
+        """
+        if index <= 0:
+            self.appendleft(entry)
+            return
+        if index >= self._length:
+            self.append(entry)
+            return
+
+        _, turn = self._locate(index)
+        self._lane(entry.requester_id).insert(turn, entry)
+        self._length += 1
+        self._record('reset')
+
+    def move(self, index: int, target: int):
+        """Move the entry at a position as close as possible to another position."""
+        entry = self.pop(index)
+        self.insert(target, entry)
+        return entry
+
+    def count_requester(self, requester_id: int) -> int:
+        """Return the number of entries requested by a user."""
+        lane = self._lanes.get(requester_id)
+        return len(lane) if lane else 0
+
+    def remove_requester(self, requester_id: int) -> int:
+        """Remove all entries requested by a user and return their count."""
+        lane = self._lanes.pop(requester_id, None)
+        if lane is None:
+            return 0
+
+        self._length -= len(lane)
+        self._record('reset')
+        return len(lane)
+
+    def is_duplicate(self, entry) -> bool:
+        """Return whether the track of an entry is already queued."""
+        return any(lane.is_duplicate(entry) for lane in self._lanes.values())
+
+    def rekey(self, entry, old_id):
+        """Count a queued entry by its ID after it changed from another one."""
+        lane = self._lanes.get(entry.requester_id)
+        if lane is not None:
+            lane.rekey(entry, old_id)
+
+    def dedupe(self) -> int:
+        """Remove all but the first entry of each track and return the removed count."""
+        seen = set()
+        entries = []
+        for entry in self:
+            if entry.id in seen:
+                continue
+            seen.add(entry.id)
+            entries.append(entry)
+
+        removed = self._length - len(entries)
+        if removed > 0:
+            self.clear()
+            self.extend(entries)
+        return removed
+
+    def shuffle(self):
+        """Shuffle the entries of every requester and the order of the turns."""
+        for lane in self._lanes.values():
+            lane.shuffle()
+
+        order = list(self._lanes)
+        random.shuffle(order)
+        for requester_id in order:
+            self._lanes.move_to_end(requester_id)
+
+        self._record('reset')
+
+    def clear(self):
+        """Remove all entries."""
+        self._lanes.clear()
+        self._length = 0
+        self._record('reset')
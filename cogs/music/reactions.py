@@ -0,0 +1,84 @@
+import asyncio
+import discord
+from discord.ext import commands, menus
+
+
+class ReactionRouter:
+    """Dispatch raw reaction events to the menu that owns the message.
+
+    A single listener looks up the menu by message id instead of every
+    running menu waiting for and checking every reaction event.
+    """
+
+    def __init__(self):
+        self.queues = {}
+
+    @classmethod
+    def install(cls, bot: commands.Bot):
+        """Attach a router to the bot unless it already has one."""
+        if hasattr(bot, 'reaction_router'):
+            return bot.reaction_router
+
+        bot.reaction_router = router = cls()
+        bot.add_listener(router.dispatch, 'on_raw_reaction_add')
+        bot.add_listener(router.dispatch, 'on_raw_reaction_remove')
+        return router
+
+    def register(self, message_id: int) -> asyncio.Queue:
+        """Return a queue receiving the reaction events of a message."""
+        queue = asyncio.Queue()
+        self.queues[message_id] = queue
+        return queue
+
+    def unregister(self, message_id: int, queue: asyncio.Queue):
+        if self.queues.get(message_id) is queue:
+            del self.queues[message_id]
+
+    async def dispatch(self, payload: discord.RawReactionActionEvent):
+        queue = self.queues.get(payload.message_id)
+        if queue is not None:
+            queue.put_nowait(payload)
+
+
+class RoutedMenu(menus.Menu):
+    """Menu that receives its reaction events from the bot's reaction router."""
+
+    async def _internal_loop(self):
+        router = self.bot.reaction_router
+        message_id = self.message.id
+        queue = router.register(message_id)
+
+        timed_out = False
+        try:
+            while self._running:
+                payload = await asyncio.wait_for(queue.get(),
+                                                 timeout=self.timeout)
+                if self.reaction_check(payload):
+                    self.bot.loop.create_task(self.update(payload))
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            router.unregister(message_id, queue)
+            self._event.set()
+
+            try:
+                await self.finalize(timed_out)
+            except Exception:
+                pass
+
+            if self.bot.is_closed():
+                return
+
+            try:
+                if self.delete_message_after:
+                    return await self.message.delete()
+
+                if self.clear_reactions_after and self._can_remove_reactions:
+                    return await self.message.clear_reactions()
+            except Exception:
+                pass
+
+
+class RoutedMenuPages(RoutedMenu, menus.MenuPages):
+    """Paginated menu that receives its reaction events from the reaction router."""
+    pass
@@ -0,0 +1,221 @@
+import aiohttp
+import asyncio
+from . import balancer
+from .breaker import CircuitBreaker
+from .cache import TTLCache
+from .errors import TrackLoadError
+from functools import partial
+import random
+import wavelink
+
+_MISSING = object()
+
+
+def count_tracks(result) -> int:
+    """Return the number of tracks of a loadtracks result, at least one."""
+    if isinstance(result, wavelink.TrackPlaylist):
+        return max(1, len(result.tracks))
+    return max(1, len(result or ()))
+
+
+class TrackResolver:
+    """Resolve queries to tracks through the lavalink nodes and cache the results."""
+
+    def __init__(self,
+                 client: wavelink.Client,
+                 *,
+                 size: int = 10000,
+                 ttl: float = 3600,
+                 negative_ttl: float = 30,
+                 attempts: int = 4,
+                 backoff_base: float = 0.5,
+                 backoff_cap: float = 4,
+                 deadline: float = 10,
+                 breaker_threshold: int = 5,
+                 breaker_reset: float = 30,
+                 concurrency: int = 8,
+                 metrics=None):
+        self.client = client
+        # Bounded by tracks, a playlist can hold thousands of them.
+        self.cache = TTLCache(size, ttl, weigh=count_tracks)
+        self.negative_ttl = negative_ttl
+
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.deadline = deadline
+
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers = {}
+
+        # Bound the number of concurrent requests per node.
+        self.concurrency = concurrency
+        self.semaphores = {}
+
+        self._pending = {}
+
+        self.latency = None
+        self.failures = None
+        self.gauges = []
+        if metrics is not None:
+            self.latency = metrics.histogram(
+                'lavabot_track_load_duration_seconds',
+                'Duration of successful loadtracks requests.', ('node',))
+            self.failures = metrics.counter(
+                'lavabot_track_load_failures_total',
+                'Failed loadtracks requests by node and reason.',
+                ('node', 'reason'))
+
+            # Read from the cache's own counters when they are collected.
+            self.gauges = [
+                metrics.gauge('lavabot_track_cache_hits',
+                              'Track cache lookups that found a result.'),
+                metrics.gauge('lavabot_track_cache_misses',
+                              'Track cache lookups that found nothing.')
+            ]
+            self.gauges[0].set_function(lambda: {(): self.cache.hits})
+            self.gauges[1].set_function(lambda: {(): self.cache.misses})
+
+    @classmethod
+    def from_config(cls, client: wavelink.Client, config: dict, **kwargs):
+        """Create a resolver from the bot configuration."""
+        cache_config = config.get('track_cache', {})
+        loading_config = config.get('track_loading', {})
+        return cls(client, **cache_config, **loading_config, **kwargs)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Return the cache key for a query."""
+        query = ' '.join(query.split())
+        if query.startswith('ytsearch:'):
+            return 'ytsearch:' + query[len('ytsearch:'):].strip().lower()
+        return query
+
+    def get_breaker(self, node: wavelink.Node) -> CircuitBreaker:
+        """Return the circuit breaker of a node."""
+        breaker = self.breakers.get(node.identifier)
+        if breaker is None:
+            breaker = CircuitBreaker(threshold=self.breaker_threshold,
+                                     reset_timeout=self.breaker_reset)
+            self.breakers[node.identifier] = breaker
+        return breaker
+
+    def get_semaphore(self, node: wavelink.Node) -> asyncio.Semaphore:
+        """Return the semaphore limiting the concurrent requests to a node."""
+        semaphore = self.semaphores.get(node.identifier)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self.semaphores[node.identifier] = semaphore
+        return semaphore
+
+    def get_node(self) -> wavelink.Node:
+        """Return the least loaded available node whose circuit is not open."""
+        nodes = [
+            node for node in self.client.nodes.values()
+            if node.is_available and self.get_breaker(node).allow()
+        ]
+        if not nodes:
+            raise TrackLoadError('No music node is available right now.')
+
+        return min(nodes, key=balancer.node_penalty)
+
+    async def resolve(self, query: str):
+        """Return the tracks or the playlist for a query or None if nothing was found.
+
+        Raises TrackLoadError if no node could answer the request in time.
+        """
+        key = self.normalize(query)
+
+        result = self.cache.get(key, _MISSING)
+        if result is not _MISSING:
+            return result
+
+        # Concurrent callers with the same query share one request.
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load_and_cache(key))
+            future.add_done_callback(partial(self._forget, key))
+            self._pending[key] = future
+
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+    async def _load_and_cache(self, query: str):
+        result = await self._load(query)
+
+        ttl = None if result else self.negative_ttl
+        self.cache.set(query, result, ttl=ttl)
+        return result
+
+    async def _load(self, query: str):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.deadline
+
+        for attempt in range(self.attempts):
+            node = self.get_node()
+            breaker = self.get_breaker(node)
+
+            async with self.get_semaphore(node):
+                # Waiting for a free slot is not the node's fault.
+                if loop.time() >= deadline:
+                    break
+
+                breaker.record_attempt()
+                start = loop.time()
+                try:
+                    data = await asyncio.wait_for(
+                        self._request(node, query),
+                        timeout=deadline - loop.time())
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    breaker.record_failure()
+                    self._record_failure(node, type(e).__name__)
+                else:
+                    breaker.record_success()
+
+                    # LOAD_FAILED is usually a hiccup of the source, not the
+                    # node.
+                    if data.get('loadType') != 'LOAD_FAILED':
+                        if self.latency is not None:
+                            self.latency.observe(loop.time() - start,
+                                                 node.identifier)
+                        return self._parse(data)
+
+                    self._record_failure(node, 'LOAD_FAILED')
+
+            # Full jitter exponential backoff, bounded by the deadline.
+            delay = random.uniform(
+                0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+            if attempt + 1 >= self.attempts or loop.time() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+        raise TrackLoadError('Could not load tracks.')
+
+    def _record_failure(self, node: wavelink.Node, reason: str):
+        if self.failures is not None:
+            self.failures.inc(node.identifier, reason)
+
+    async def _request(self, node: wavelink.Node, query: str) -> dict:
+        async with node.session.get(f'{node.rest_uri}/loadtracks',
+                                    params={'identifier': query},
+                                    headers={'Authorization':
+                                             node.password}) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    @staticmethod
+    def _parse(data: dict):
+        if not data.get('tracks'):
+            return None
+
+        if data.get('playlistInfo'):
+            return wavelink.TrackPlaylist(data=data)
+
+        return [
+            wavelink.Track(track['track'], track['info'])
+            for track in data['tracks']
+        ]
@@ -0,0 +1,228 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import sqlite3
+
+SCHEMA = ('''
+CREATE TABLE IF NOT EXISTS players (
+    guild_id INTEGER PRIMARY KEY,
+    channel_id INTEGER,
+    volume INTEGER NOT NULL,
+    paused INTEGER NOT NULL,
+    repeat_one INTEGER NOT NULL,
+    fair INTEGER NOT NULL,
+    current TEXT,
+    position INTEGER NOT NULL,
+    lanes TEXT
+)''', '''
+CREATE TABLE IF NOT EXISTS queue (
+    guild_id INTEGER NOT NULL,
+    lane INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (guild_id, lane, seq)
+) WITHOUT ROWID''')
+# Stored as the user_version of the database, see PlayerStore.upgrade.
+SCHEMA_VERSION = 1
+
+
+def take_turns(lanes: list) -> list:
+    """Return the entries of the lanes in the order they take turns."""
+    entries = []
+    for turn in itertools.zip_longest(*lanes):
+        entries.extend(x for x in turn if x is not None)
+    return entries
+
+
+class PlayerStore:
+    """Persist the players and their queues in a SQLite database.
+
+    The database runs in write-ahead log mode and queues are stored one row
+    per entry, so the changes recorded in a queue journal are written as
+    single row inserts and deletes. A fair queue is stored per lane, the
+    lane of an entry is its requester ID and the order of the lanes is kept
+    in the player row. Other queues are stored in lane 0. All database
+    access happens on one worker thread, use the executor to run the
+    methods.
+    """
+
+    def __init__(self, path: str):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        version, = self.connection.execute('PRAGMA user_version').fetchone()
+        if version < SCHEMA_VERSION and self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'players'").fetchone():
+            self.upgrade()
+
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+        # The first and last queue sequence number in use per guild and lane.
+        self.bounds = {}
+        # The last written player row per guild.
+        self.rows = {}
+
+    def upgrade(self):
+        """Move a database without queue lanes to the current schema."""
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.execute('ALTER TABLE players ADD COLUMN lanes TEXT')
+            self.connection.execute('ALTER TABLE queue RENAME TO old_queue')
+            self.connection.execute(SCHEMA[1])
+
+            fair = {
+                guild_id for guild_id, in self.connection.execute(
+                    'SELECT guild_id FROM players WHERE fair')
+            }
+            lanes = {}
+            for guild_id, seq, entry in self.connection.execute(
+                    'SELECT guild_id, seq, entry FROM old_queue '
+                    'ORDER BY guild_id, seq').fetchall():
+                if guild_id not in fair:
+                    self.connection.execute(
+                        'INSERT INTO queue VALUES (?, 0, ?, ?)',
+                        (guild_id, seq, entry))
+                    continue
+
+                # The rows of a fair queue are in the order they are served.
+                lane = json.loads(entry)['requester_id']
+                seqs = lanes.setdefault(guild_id, {})
+                seqs[lane] = seqs.get(lane, -1) + 1
+                self.connection.execute('INSERT INTO queue VALUES (?, ?, ?, ?)',
+                                        (guild_id, lane, seqs[lane], entry))
+
+            for guild_id, seqs in lanes.items():
+                self.connection.execute(
+                    'UPDATE players SET lanes = ? WHERE guild_id = ?',
+                    (json.dumps(list(seqs)), guild_id))
+            self.connection.execute('DROP TABLE old_queue')
+
+    def load(self) -> list:
+        """Return the stored state of all players."""
+        states = {}
+        for row in self.connection.execute('SELECT * FROM players'):
+            (guild_id, channel_id, volume, paused, repeat_one, fair, current,
+             position, _) = row
+            states[guild_id] = {
+                'guild_id': guild_id,
+                'channel_id': channel_id,
+                'volume': volume,
+                'paused': bool(paused),
+                'repeat_one': bool(repeat_one),
+                'fair': bool(fair),
+                'current': json.loads(current) if current else None,
+                'position': position,
+                'queue': []
+            }
+            self.rows[guild_id] = row
+
+        queues = {}
+        for guild_id, lane, seq, entry in self.connection.execute(
+                'SELECT guild_id, lane, seq, entry FROM queue '
+                'ORDER BY guild_id, lane, seq'):
+            if guild_id not in states:
+                continue
+
+            queues.setdefault(guild_id, {}).setdefault(lane, []).append(
+                json.loads(entry))
+
+            bounds = self.bounds.setdefault(guild_id, {})
+            bounds[lane] = (bounds.get(lane, (seq,))[0], seq)
+
+        for guild_id, lanes in queues.items():
+            order = json.loads(self.rows[guild_id][8] or '[]')
+            states[guild_id]['queue'] = take_turns(
+                [lanes.pop(x) for x in order if x in lanes] +
+                list(lanes.values()))
+
+        return list(states.values())
+
+    def save(self, states: list, removed: list):
+        """Write the changed players and delete the removed ones in one transaction.
+
+        Every state is a dict with the player row under 'row', the journal
+        of its queue under 'journal' and, if the journal was reset, the
+        queue entries under 'entries'.
+        """
+        # Written to the bounds and rows only after the commit, so they
+        # still match the database if the transaction is rolled back.
+        rows = {}
+        bounds = {}
+        with self.connection:
+            for state in states:
+                self._save(state, rows, bounds)
+
+            for guild_id in removed:
+                self.connection.execute(
+                    'DELETE FROM players WHERE guild_id = ?', (guild_id,))
+                self.connection.execute('DELETE FROM queue WHERE guild_id = ?',
+                                        (guild_id,))
+
+        self.rows.update(rows)
+        self.bounds.update(bounds)
+        for guild_id in removed:
+            self.bounds.pop(guild_id, None)
+            self.rows.pop(guild_id, None)
+
+    def _save(self, state: dict, rows: dict, bounds: dict):
+        row = state['row']
+        guild_id = row[0]
+        fair = row[5]
+
+        if self.rows.get(guild_id) != row:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO players '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+            rows[guild_id] = row
+
+        journal = state['journal']
+        if not journal:
+            return
+
+        # The first and last sequence number in use per lane.
+        lanes = dict(self.bounds.get(guild_id, {}))
+
+        if journal[0][0] == 'reset':
+            self.connection.execute('DELETE FROM queue WHERE guild_id = ?',
+                                    (guild_id,))
+            lanes.clear()
+            journal = [('append', x) for x in state['entries']]
+
+        for operation in journal:
+            if operation[0] == 'popleft':
+                lane = operation[1] if fair else 0
+                head, last = lanes.pop(lane)
+                self.connection.execute(
+                    'DELETE FROM queue '
+                    'WHERE guild_id = ? AND lane = ? AND seq = ?',
+                    (guild_id, lane, head))
+                if head < last:
+                    lanes[lane] = (head + 1, last)
+                continue
+
+            entry = operation[1]
+            lane = entry.requester_id if fair else 0
+            head, last = lanes.get(lane, (0, -1))
+            if operation[0] == 'append':
+                last += 1
+                seq = last
+            else:
+                head -= 1
+                seq = head
+
+            self.connection.execute('INSERT INTO queue VALUES (?, ?, ?, ?)',
+                                    (guild_id, lane, seq,
+                                     json.dumps(entry.to_dict())))
+            lanes[lane] = (head, last)
+
+        bounds[guild_id] = lanes
+
+    def close(self):
+        """Close the database after the pending writes."""
+        self.executor.submit(self.connection.close)
+        self.executor.shutdown(wait=False)
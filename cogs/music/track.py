@@ -1,16 +1,22 @@
 from datetime import datetime
+import discord
+from .errors import TrackLoadError
 import wavelink
 
+EPOCH = datetime(1970, 1, 1)
+
 
 class Track(wavelink.Track):
     """Wavelink Track object with a requester attribute."""
 
-    __slots__ = ('requester', 'requested_at')
+    __slots__ = ('requester', 'requester_id', 'requested_at')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args)
 
         self.requester = kwargs.get('requester')
+        self.requester_id = kwargs.get(
+            'requester_id', self.requester.id if self.requester else None)
         self.requested_at = kwargs.get('requested_at', datetime.utcnow())
 
     @property
@@ -22,3 +28,178 @@ class Track(wavelink.Track):
     def youtube_id(self):
         """Return the track's YouTube id."""
         return self.ytid
+
+
+class QueueEntry:
+    """Compact queue entry that is turned into a Track when it is played.
+
+    Only the encoded lavalink track, the requester id, the request time in
+    whole seconds and the track info fields used by the bot are kept. The
+    info dict and the requester member are dropped.
+    """
+
+    __slots__ = ('id', 'requester_id', 'requested_at', 'title', 'author',
+                 'uri', 'length', 'identifier', 'is_stream', 'is_seekable')
+
+    def __init__(self, id_: str, info: dict, requester_id: int,
+                 requested_at: int):
+        self.id = id_
+        self.requester_id = requester_id
+        self.requested_at = requested_at
+
+        self.title = info.get('title')
+        self.author = info.get('author')
+        self.uri = info.get('uri')
+        self.length = info.get('length')
+        self.identifier = info.get('identifier', '')
+        self.is_stream = info.get('isStream')
+        self.is_seekable = info.get('isSeekable')
+
+    @classmethod
+    def from_track(cls, track: wavelink.Track, requester_id: int = None,
+                   requested_at: datetime = None):
+        """Create an entry from a track."""
+        if requester_id is None:
+            requester_id = track.requester_id
+        if requested_at is None:
+            requested_at = getattr(track, 'requested_at', None) or \
+                datetime.utcnow()
+
+        timestamp = int((requested_at - EPOCH).total_seconds())
+        return cls(track.id, track.info, requester_id, timestamp)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Create an entry from its serialized form."""
+        return cls(data['id'], data['info'], data['requester_id'],
+                   int(data['requested_at']))
+
+    @property
+    def duration(self):
+        """Alias to length."""
+        return self.length
+
+    @property
+    def info(self) -> dict:
+        """Return the track info needed to rebuild the track."""
+        return {
+            'title': self.title,
+            'author': self.author,
+            'uri': self.uri,
+            'length': self.length,
+            'identifier': self.identifier,
+            'isStream': self.is_stream,
+            'isSeekable': self.is_seekable
+        }
+
+    def to_dict(self) -> dict:
+        """Return the entry in a JSON serializable form."""
+        return {
+            'id': self.id,
+            'info': self.info,
+            'requester_id': self.requester_id,
+            'requested_at': self.requested_at
+        }
+
+    def to_track(self, guild: discord.Guild) -> Track:
+        """Return the full track, looking up the requester in a guild."""
+        requester = guild.get_member(self.requester_id) or guild.me
+        return Track(self.id,
+                     self.info,
+                     requester=requester,
+                     requester_id=self.requester_id,
+                     requested_at=datetime.utcfromtimestamp(self.requested_at))
+
+
+class PendingEntry:
+    """Queue entry of a search that is resolved shortly before it is played.
+
+    The player's prefetcher resolves the entries at the front of the queue.
+    If nothing was found or the search failed, the entry is skipped.
+    """
+
+    __slots__ = ('query', 'requester_id', 'requested_at', 'entry', 'failed')
+
+    def __init__(self, query: str, requester_id: int, requested_at: int = None):
+        self.query = query
+        self.requester_id = requester_id
+        if requested_at is None:
+            requested_at = int((datetime.utcnow() - EPOCH).total_seconds())
+        self.requested_at = requested_at
+
+        # The resolved entry, None until the search succeeded.
+        self.entry: QueueEntry = None
+        self.failed = False
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Create an entry from its serialized form."""
+        return cls(data['query'], data['requester_id'],
+                   int(data['requested_at']))
+
+    @property
+    def id(self) -> str:
+        """Return the track ID once resolved, the query while the entry is pending."""
+        if self.entry is not None:
+            return self.entry.id
+        return self.query
+
+    @property
+    def is_resolved(self) -> bool:
+        """Return whether the search finished, successfully or not."""
+        return self.entry is not None or self.failed
+
+    @property
+    def title(self):
+        if self.entry is not None:
+            return self.entry.title
+        return self.query.split(':', 1)[-1]
+
+    @property
+    def uri(self):
+        return self.entry.uri if self.entry is not None else None
+
+    @property
+    def length(self):
+        return self.entry.length if self.entry is not None else None
+
+    duration = length
+
+    async def resolve(self, resolver) -> QueueEntry:
+        """Search the track and return the resolved entry or None on failure."""
+        if self.is_resolved:
+            return self.entry
+
+        try:
+            result = await resolver.resolve(self.query)
+        except TrackLoadError:
+            result = None
+
+        if isinstance(result, wavelink.TrackPlaylist):
+            result = result.tracks
+
+        if result:
+            self.entry = QueueEntry(result[0].id, result[0].info,
+                                    self.requester_id, self.requested_at)
+        else:
+            self.failed = True
+
+        return self.entry
+
+    def to_dict(self) -> dict:
+        """Return the entry in a JSON serializable form."""
+        if self.entry is not None:
+            return self.entry.to_dict()
+
+        return {
+            'query': self.query,
+            'requester_id': self.requester_id,
+            'requested_at': self.requested_at
+        }
+
+
+def entry_from_dict(data: dict):
+    """Create a resolved or pending queue entry from its serialized form."""
+    if 'query' in data:
+        return PendingEntry.from_dict(data)
+    return QueueEntry.from_dict(data)
@@ -15,7 +15,61 @@ default_config = {
         'region': 'eu_central',
         'rest_uri': 'http://127.0.0.1:2333'
     }],
-    'dj_roles': {}
+    'metrics': {
+        'enabled': False,
+        'host': '127.0.0.1',
+        'port': 9100
+    },
+    'node_selection': {
+        'region_penalty': 100
+    },
+    'nodes': {
+        'connect_timeout': 10,
+        'reconnect_interval': 30,
+        'stop_timeout': 5
+    },
+    'dj_roles': {},
+    'failover': {
+        'grace': 3,
+        'interval': 2
+    },
+    'persistence': {
+        'interval': 1,
+        'path': 'players.db'
+    },
+    'playlist_import': {
+        'chunk_size': 100,
+        'progress_interval': 2
+    },
+    'prefetch': {
+        'ahead': 3
+    },
+    'privilege_cache': {
+        'size': 4096,
+        'ttl': 60
+    },
+    'shutdown': {
+        'timeout': 10
+    },
+    'track_cache': {
+        'negative_ttl': 30,
+        'size': 10000,
+        'ttl': 3600
+    },
+    'track_loading': {
+        'attempts': 4,
+        'backoff_base': 0.5,
+        'backoff_cap': 4,
+        'breaker_reset': 30,
+        'breaker_threshold': 5,
+        'concurrency': 8,
+        'deadline': 10
+    },
+    'watchdog': {
+        'enabled': True,
+        'interval': 0.25,
+        'threshold': 0.5
+    }
 }
 
 
@@ -0,0 +1,91 @@
+import asyncio
+import discord
+import heapq
+import itertools
+
+
+class MessageExpiry:
+    """Delete messages after a delay, bulk deleting them per channel.
+
+    All pending messages are kept in one heap served by a single task
+    instead of a timer task and a request per message. Messages of a
+    channel that expire together are removed with one bulk delete when the
+    bot is allowed to, otherwise one by one.
+    """
+
+    # Bulk deletes accept at most this many messages.
+    BULK_LIMIT = 100
+    # Seconds to wait after the first expiry to collect more messages.
+    BATCH_WINDOW = 0.5
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+        self._heap = []
+        self._scheduled = set()
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, message: discord.Message, delay: float):
+        """Delete a message after a delay in seconds."""
+        if message.id in self._scheduled:
+            return
+
+        self._scheduled.add(message.id)
+        heapq.heappush(self._heap,
+                       (self.loop.time() + delay, next(self._counter), message))
+
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    async def _run(self):
+        while self._heap:
+            timeout = self._heap[0][0] - self.loop.time()
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await asyncio.sleep(self.BATCH_WINDOW)
+
+            now = self.loop.time()
+            channels = {}
+            while self._heap and self._heap[0][0] <= now:
+                _, _, message = heapq.heappop(self._heap)
+                self._scheduled.discard(message.id)
+                channels.setdefault(message.channel.id, []).append(message)
+
+            await asyncio.gather(
+                *[self._delete(messages) for messages in channels.values()])
+
+    async def _delete(self, messages: list):
+        channel = messages[0].channel
+
+        if (len(messages) > 1 and isinstance(channel, discord.TextChannel) and
+                channel.permissions_for(channel.guild.me).manage_messages):
+            for i in range(0, len(messages), self.BULK_LIMIT):
+                chunk = messages[i:i + self.BULK_LIMIT]
+                try:
+                    await channel.delete_messages(chunk)
+                except discord.HTTPException:
+                    await self._delete_each(chunk)
+            return
+
+        await self._delete_each(messages)
+
+    @staticmethod
+    async def _delete_each(messages: list):
+        for message in messages:
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                pass
@@ -4,6 +4,20 @@ import itertools
 
 
 class CustomHelpCommand(commands.DefaultHelpCommand):
+    """Help command whose embeds are rendered once and then reused.
+
+    The embeds are cached by prefix, target and the outcome of the checks
+    of the listed commands. Every distinct check runs once per invocation
+    instead of once per command. The cache is cleared by the bot whenever
+    an extension is loaded, reloaded or unloaded.
+    """
+
+    # Shared by the copies of the help command made for every invocation.
+    _embeds = {}
+
+    @classmethod
+    def clear_cache(cls):
+        cls._embeds.clear()
 
     def command_not_found(self, command):
         return f'Command `{command}` is not found'
@@ -16,12 +30,65 @@ class CustomHelpCommand(commands.DefaultHelpCommand):
 
     async def send_error_message(self, error):
         destination = self.get_destination()
-        await destination.send(f':x: {error}.', delete_after=5)
-        await self.context.message.delete(delay=5)
+        message = await destination.send(f':x: {error}.')
 
-    async def send_bot_help(self, mapping):
+        expiry = self.context.bot.expiry
+        expiry.schedule(message, 5)
+        expiry.schedule(self.context.message, 5)
+
+    async def check_outcomes(self, commands_) -> frozenset:
+        """Return which of the distinct checks of some commands pass."""
         ctx = self.context
-        bot = ctx.bot
+        if self.verify_checks is False or (self.verify_checks is None and
+                                           not ctx.guild):
+            return frozenset()
+
+        outcomes = {}
+
+        async def run(key, predicate):
+            if key in outcomes:
+                return
+            try:
+                outcomes[key] = bool(await discord.utils.maybe_coroutine(
+                    predicate, ctx))
+            except commands.CommandError:
+                outcomes[key] = False
+
+        await run('bot', ctx.bot.can_run)
+        for command in commands_:
+            cog = command.cog
+            if cog is not None:
+                local_check = commands.Cog._get_overridden_method(
+                    cog.cog_check)
+                if local_check is not None:
+                    await run(('cog', cog.qualified_name), local_check)
+
+            # Checks like guild_only create a new function for every
+            # command, but share the code if they do not close over values.
+            for predicate in command.checks:
+                closure = getattr(predicate, '__closure__', None)
+                code = getattr(predicate, '__code__', None)
+                await run(code if closure is None and code else predicate,
+                          predicate)
+
+        return frozenset(outcomes.items())
+
+    async def send_cached(self, key: tuple, render):
+        """Send the embed cached under a key, rendering it if missing."""
+        key = (self.clean_prefix,) + key
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = self._embeds[key] = await render()
+
+        await self.context.send(embed=embed, delete_after=15)
+
+    async def send_bot_help(self, mapping):
+        bot = self.context.bot
+        outcomes = await self.check_outcomes(bot.commands)
+        await self.send_cached(('bot', None, outcomes), self.render_bot_help)
+
+    async def render_bot_help(self) -> discord.Embed:
+        bot = self.context.bot
 
         embed = discord.Embed(title=':scroll: Help', color=discord.Color.gold()) \
             .set_footer(text=f'Type\u2002{self.clean_prefix}help <command>\u2002for more info on a command.\nYou can also type\u2002{self.clean_prefix}help <category>\u2002for more info on a category.')
@@ -48,11 +115,14 @@ class CustomHelpCommand(commands.DefaultHelpCommand):
             ])
 
             embed.add_field(name=cog_name, value=text, inline=False)
-        await ctx.send(embed=embed, delete_after=15)
+        return embed
 
     async def send_cog_help(self, cog):
-        ctx = self.context
+        outcomes = await self.check_outcomes(cog.get_commands())
+        await self.send_cached(('cog', cog.qualified_name, outcomes),
+                               lambda: self.render_cog_help(cog))
 
+    async def render_cog_help(self, cog) -> discord.Embed:
         embed = discord.Embed(title=':scroll: Help', color=discord.Color.gold())
 
         if cog.description:
@@ -70,11 +140,14 @@ class CustomHelpCommand(commands.DefaultHelpCommand):
                             inline=False)
         else:
             embed.description = 'No commands in category'
-        await ctx.send(embed=embed, delete_after=15)
+        return embed
 
     async def send_group_help(self, group):
-        ctx = self.context
+        outcomes = await self.check_outcomes(group.commands)
+        await self.send_cached(('group', group.qualified_name, outcomes),
+                               lambda: self.render_group_help(group))
 
+    async def render_group_help(self, group) -> discord.Embed:
         embed = discord.Embed(title=':scroll: Help', color=discord.Color.gold())
 
         commands = await self.filter_commands(group.commands, sort=True)
@@ -87,11 +160,13 @@ class CustomHelpCommand(commands.DefaultHelpCommand):
                             inline=False)
         else:
             embed.description = 'No commands in this group'
-        await ctx.send(embed=embed, delete_after=15)
+        return embed
 
     async def send_command_help(self, command):
-        ctx = self.context
+        await self.send_cached(('command', command.qualified_name, None),
+                               lambda: self.render_command_help(command))
 
+    async def render_command_help(self, command) -> discord.Embed:
         embed = discord.Embed(title=':scroll: Help', color=discord.Color.gold())
         if command.description:
             embed.add_field(name='Description',
@@ -104,5 +179,4 @@ class CustomHelpCommand(commands.DefaultHelpCommand):
         embed.add_field(name='Usage',
                         value=f'`{self.get_command_signature(command)}`',
                         inline=False)
-
-        await ctx.send(embed=embed, delete_after=15)
+        return embed
@@ -0,0 +1,118 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+
+class LoopWatchdog:
+    """Detect callbacks that block the event loop and log where they are stuck.
+
+    A callback on the loop records a heartbeat every interval and the delay
+    it was called with as the loop lag. A thread checks the heartbeat and,
+    if the loop is blocked for longer than the threshold, prints the stack
+    of the loop thread together with the command or event returned by the
+    activity function.
+    """
+
+    def __init__(self,
+                 loop: asyncio.AbstractEventLoop,
+                 *,
+                 interval: float = 0.25,
+                 threshold: float = 0.5,
+                 activity=None,
+                 metrics=None):
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        # Returns the last started command or event, or None.
+        self.activity = activity
+
+        self.heartbeat: float = None
+        self._expected: float = None
+        self._handle: asyncio.TimerHandle = None
+
+        self._loop_thread_id: int = None
+        self._thread: threading.Thread = None
+        self._stopped = threading.Event()
+
+        self.lag = None
+        self.lag_last = None
+        self.stalls = None
+        if metrics is not None:
+            self.lag = metrics.histogram('lavabot_event_loop_lag_seconds',
+                                         'Delay of the event loop waking up.')
+            self.lag_last = metrics.gauge(
+                'lavabot_event_loop_lag_last_seconds',
+                'Last measured delay of the event loop.')
+            self.stalls = metrics.counter(
+                'lavabot_event_loop_stalls_total',
+                'Times the event loop was blocked longer than the threshold.')
+
+    def start(self):
+        """Start watching, has to be called from the thread running the loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+
+        self.heartbeat = time.monotonic()
+        self._expected = self.heartbeat + self.interval
+        self._handle = self.loop.call_later(self.interval, self._beat)
+
+        self._thread = threading.Thread(target=self._watch,
+                                        name='loop-watchdog',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        self._stopped.set()
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = max(0, now - self._expected)
+
+        if self.lag is not None:
+            self.lag.observe(lag)
+            self.lag_last.set(lag)
+
+        if lag >= self.threshold:
+            if self.stalls is not None:
+                self.stalls.inc()
+            print(f'The event loop was blocked for {lag:.3f} seconds',
+                  file=sys.stderr)
+
+        self.heartbeat = now
+        self._expected = now + self.interval
+        self._handle = self.loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+
+            # Report every stall once, while it is still going on.
+            if blocked < self.threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+
+            try:
+                self._report(blocked)
+            except Exception:
+                traceback.print_exc()
+
+    def _report(self, blocked: float):
+        # Only the stack and a plain attribute are read here, the frame
+        # locals and the running task belong to the loop thread.
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+
+        stack = ''.join(traceback.format_stack(frame))
+        activity = self.activity() if self.activity else None
+        print(
+            f'The event loop is blocked for {blocked:.3f} seconds'
+            f'{f" in {activity}" if activity else ""}:\n{stack}',
+            file=sys.stderr)
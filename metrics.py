@@ -0,0 +1,273 @@
+from aiohttp import web
+import bisect
+import logging
+import math
+import sys
+import time
+
+
+def _format_labels(labelnames: tuple, labelvalues: tuple, extra=()) -> str:
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+
+    text = ','.join('{}="{}"'.format(
+        k,
+        str(v).replace('\\', '\\\\').replace('"', '\\"').replace(
+            '\n', '\\n')) for k, v in pairs)
+    return '{' + text + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count per combination of labels."""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self.series = {}
+
+    def inc(self, *labelvalues, amount: float = 1):
+        """Increase the count for the given label values."""
+        key = tuple(str(x) for x in labelvalues)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def samples(self):
+        for labelvalues, value in self.series.items():
+            yield self.name, labelvalues, (), value
+
+
+class Gauge:
+    """Value that can go up and down, or is computed when it is collected.
+
+    If a function is set, it is called on every collection and returns a
+    dict of label value tuples to values.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self.series = {}
+        self.function = None
+
+    def set(self, value: float, *labelvalues):
+        self.series[tuple(str(x) for x in labelvalues)] = value
+
+    def set_function(self, function):
+        """Compute the values with a function when they are collected."""
+        self.function = function
+
+    def samples(self):
+        series = self.series
+        if self.function is not None:
+            series = {
+                tuple(str(x) for x in k): v
+                for k, v in self.function().items()
+            }
+
+        for labelvalues, value in series.items():
+            yield self.name, labelvalues, (), value
+
+
+class Histogram:
+    """Count observed values in cumulative buckets, per combination of labels.
+
+    The buckets are upper bounds like the ones of Prometheus histograms, an
+    implicit +Inf bucket counts all observations.
+    """
+
+    type = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5,
+                       0.75, 1, 2.5, 5, 7.5, 10)
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+        # Bucket counts, sum and count per tuple of label values.
+        self.series = {}
+
+    def _series(self, labelvalues: tuple) -> list:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects the labels '
+                             f'{", ".join(self.labelnames)}')
+
+        series = self.series.get(labelvalues)
+        if series is None:
+            series = self.series[labelvalues] = [
+                [0] * (len(self.buckets) + 1), 0.0, 0
+            ]
+        return series
+
+    def observe(self, value: float, *labelvalues):
+        """Record a value for the given label values."""
+        series = self._series(tuple(str(x) for x in labelvalues))
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labelvalues):
+        """Return a context manager observing the time spent in its block."""
+        return _Timer(self, labelvalues)
+
+    def samples(self):
+        for labelvalues, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for upper, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                yield (f'{self.name}_bucket', labelvalues,
+                       (('le', _format_value(upper)),), cumulative)
+            yield f'{self.name}_sum', labelvalues, (), total
+            yield f'{self.name}_count', labelvalues, (), count
+
+    def quantile(self, q: float, *labelvalues) -> float:
+        """Estimate a quantile from the buckets, None without observations."""
+        series = self.series.get(tuple(str(x) for x in labelvalues))
+        if series is None or series[2] == 0:
+            return None
+
+        rank = q * series[2]
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (math.inf,), series[0]):
+            if count and seen + count >= rank:
+                if upper == math.inf:
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+
+class _Timer:
+
+    def __init__(self, histogram: Histogram, labelvalues: tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start,
+                               *self.labelvalues)
+
+
+class Registry:
+    """Collection of the metrics of the bot, which outlive reloaded extensions.
+
+    Metrics are plain dicts updated in place, so recording a value costs a
+    few dictionary operations. They are only formatted when scraped.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name: str, documentation: str, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, documentation, labelnames,
+                                              **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f'{name} is already registered as a {metric.type}')
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """Return the counter with a name, creating it if necessary."""
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        """Return the gauge with a name, creating it if necessary."""
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(),
+                  **kwargs) -> Histogram:
+        """Return the histogram with a name, creating it if necessary."""
+        return self._get(Histogram, name, documentation, labelnames, **kwargs)
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                print(f'Failed to collect {metric.name}: {e}', file=sys.stderr)
+                continue
+
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labelvalues, extra, value in samples:
+                labels = _format_labels(metric.labelnames, labelvalues, extra)
+                lines.append(f'{name}{labels} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class RateLimitHandler(logging.Handler):
+    """Count the rate limit warnings logged by discord.py.
+
+    discord.py retries requests that got a 429 response itself, the
+    warnings it logs are the only trace of them.
+    """
+
+    def __init__(self, counter: Counter):
+        super().__init__(logging.WARNING)
+        self.counter = counter
+
+    def emit(self, record: logging.LogRecord):
+        message = str(record.msg)
+        if message.startswith('We are being rate limited'):
+            self.counter.inc('bucket')
+        elif message.startswith('Global rate limit'):
+            self.counter.inc('global')
+
+
+class MetricsServer:
+    """Serve the metrics of a registry over HTTP for Prometheus."""
+
+    def __init__(self, registry: Registry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+
+        self.runner: web.AppRunner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})